@@ -9,35 +9,33 @@ import asyncio
 import random
 import requests
 import base64
+import bisect
+import contextlib
 import certifi
 import logging
 import aiohttp
-from PIL import Image
+from aiohttp import web
 from io import BytesIO
-from datetime import datetime, timedelta
+from datetime import datetime
 import re
+import functools
+import gc
+import heapq
+import itertools
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 logging.getLogger('discord').setLevel(logging.WARNING)
 
 
 import ssl
 from requests.adapters import HTTPAdapter
-from urllib3.poolmanager import PoolManager
-from requests.adapters import HTTPAdapter
-from requests.sessions import Session
-
-
-class TLSAdapter(HTTPAdapter):
-    def init_poolmanager(self, *args, **kwargs):
-        ctx = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
-        ctx.set_ciphers("DEFAULT@SECLEVEL=1")
-        kwargs["ssl_context"] = ctx
-        return super().init_poolmanager(*args, **kwargs)
-
-
-session = Session()
-session.verify = certifi.where()
-session.mount("https://", TLSAdapter())
+from urllib3.util.retry import Retry
 
 
 # === LOAD ENV ===
@@ -45,25 +43,8 @@ load_dotenv()
 
 PERMISSIONS_FILE = "permissions.json"
 
-
-permissions = {}
-if os.path.exists(PERMISSIONS_FILE):
-    try:
-        with open(PERMISSIONS_FILE, "r") as f:
-            permissions = json.load(f)
-
-        # print(f"[DEBUG] Loaded permissions: {json.dumps(permissions, indent=2)}")
-    except json.JSONDecodeError as e:
-        print(f"[ERROR] Failed to parse permissions file: {e}")
-        # Optional: back up the corrupted file
-        os.rename(PERMISSIONS_FILE, PERMISSIONS_FILE + ".bak")
-        print(f"[INFO] Corrupted permissions file backed up.")
-else:
-    print("[INFO] No permissions file found, starting fresh.")
-
 #Poll settings to keep your bot from being rate limited by discord API
 active_polls = {}  # key = poll name
-locks = {}  # {message_id: asyncio.Lock()}
 
 #You can chose to use .env file or environment variables.
 # === CONFIG ===
@@ -74,6 +55,239 @@ SPOTIFY_REDIRECT_URI = os.getenv("YOUR_SPOTIFY_REDIRECT_URI")
 OPENAI_API_KEY = os.getenv("YOUR_OPENAI_API_KEY")
 ART_SETTING_FILE = "art_setting.json"
 
+# === SHARDING ===
+# The bot is an AutoShardedBot: by default Discord picks the shard count and
+# one process runs them all. Cluster mode (CLUSTER_WORKERS=N) runs N worker
+# processes, each owning a contiguous range of shards, over the shared SQLite
+# database. Discord only delivers a guild's events to the shard that owns it,
+# so every guild is written by exactly one worker. Process-local state files
+# (polls, art jobs, track cache) get a per-cluster name.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "0"))
+CLUSTER_ID = os.getenv("CLUSTER_ID")  # set by the supervisor for each worker
+CLUSTER_RESTART_DELAY = float(os.getenv("CLUSTER_RESTART_DELAY", "5"))  # seconds
+
+
+def shard_for_guild(guild_id, shard_count=None):
+    return (int(guild_id) >> 22) % (shard_count or SHARD_COUNT or 1)
+
+
+def owns_guild(guild_id):
+    return SHARD_IDS is None or shard_for_guild(guild_id) in SHARD_IDS
+
+
+def cluster_path(path):
+    if CLUSTER_ID is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.cluster{CLUSTER_ID}{ext}"
+
+
+def shard_ranges(shard_count, workers):
+    # Split shards into contiguous, near-equal ranges, one per worker
+    base, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for worker in range(workers):
+        size = base + (1 if worker < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return [r for r in ranges if r]
+
+# === METRICS ===
+# Counters, gauges and histograms kept in plain dicts keyed by label values,
+# served in Prometheus text format on METRICS_HOST:METRICS_PORT/metrics
+# (disabled when METRICS_PORT is 0). Recording is a dict update plus a
+# bisect, cheap enough to leave on.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "1"))  # seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values = {}  # label values tuple: value
+
+    def inc(self, *labels, amount=1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}  # label values tuple: [bucket counts..., sum, count]
+
+    def observe(self, *labels, value):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        # Buckets are stored non-cumulative and summed at render time
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        names = self.labelnames + ("le",)
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{format_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{format_labels(names, labels + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {series[-2]}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {series[-1]}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # called before rendering to refresh point-in-time gauges
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"[ERROR] Metrics collector failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+COMMAND_SECONDS = metrics.histogram("lpbot_command_duration_seconds", "Command latency", ("command", "guild"))
+COMMANDS_TOTAL = metrics.counter("lpbot_commands_total", "Commands run", ("command", "guild", "status"))
+COMMANDS_IN_FLIGHT = metrics.gauge("lpbot_commands_in_flight", "Commands currently running", ("command",))
+EXTERNAL_SECONDS = metrics.histogram("lpbot_external_request_duration_seconds", "Outbound API call latency", ("service", "endpoint"))
+EXTERNAL_TOTAL = metrics.counter("lpbot_external_requests_total", "Outbound API calls", ("service", "endpoint", "status"))
+EXTERNAL_IN_FLIGHT = metrics.gauge("lpbot_external_requests_in_flight", "Outbound API calls in progress", ("service",))
+LOOP_LAG_SECONDS = metrics.histogram("lpbot_event_loop_lag_seconds", "Event loop scheduling delay",
+                                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+LOOP_LAG_LAST = metrics.gauge("lpbot_event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+
+def record_external(service, endpoint, status, started):
+    EXTERNAL_SECONDS.observe(service, endpoint, value=time.perf_counter() - started)
+    EXTERNAL_TOTAL.inc(service, endpoint, status)
+
+
+@contextlib.asynccontextmanager
+async def observe_external(service, endpoint):
+    started = time.perf_counter()
+    status = "ok"
+    EXTERNAL_IN_FLIGHT.inc(service)
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        EXTERNAL_IN_FLIGHT.dec(service)
+        record_external(service, endpoint, status, started)
+
+
+class MetricsServer:
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT):
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.lag_task = None
+
+    async def start(self):
+        self.lag_task = asyncio.create_task(self._watch_loop_lag())
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        try:
+            await web.TCPSite(self.runner, self.host, self.port).start()
+        except OSError as e:
+            # Metrics are optional; never let a taken port stop the bot
+            print(f"[ERROR] Could not serve metrics on {self.host}:{self.port}: {e}")
+            await self.runner.cleanup()
+            self.runner = None
+            return
+        print(f"[INFO] Metrics on http://{self.host}:{self.port}/metrics")
+
+    async def _handle(self, request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def _watch_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, loop.time() - started - LOOP_LAG_INTERVAL)
+            LOOP_LAG_SECONDS.observe(value=lag)
+            LOOP_LAG_LAST.set(value=lag)
+
+    async def stop(self):
+        if self.lag_task is not None:
+            self.lag_task.cancel()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+# Cluster workers inherit the same METRICS_PORT; each serves on METRICS_PORT + CLUSTER_ID
+metrics_server = MetricsServer(port=METRICS_PORT + int(CLUSTER_ID) if METRICS_PORT and CLUSTER_ID else METRICS_PORT)
+
 # === INTENTS ===
 intents = discord.Intents.default()
 intents.message_content = True
@@ -81,56 +295,1214 @@ intents.presences = True
 intents.members = True
 
 # === BOT CONFIG ===
-bot = commands.Bot(command_prefix="!", intents=intents)
+class LPBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        self.instrument_http()
+        await metrics_server.start()
+        persistence.start()
+        sync_playlist_mirrors.start()
+        memory_sweeper.start()
+        art_jobs.resume()
+
+    async def close(self):
+        if self.is_closed():
+            return
+        # Disconnect first so no new events (and writes) arrive while state is flushed and the store closed
+        await super().close()
+        poll_scheduler.shutdown()
+        art_jobs.shutdown()
+        spotify_scheduler.shutdown()
+        spotify.shutdown()
+        track_cache.save()
+        await http_clients.close()
+        spotify_http.close()
+        await persistence.stop()
+        store.close()
+        await metrics_server.stop()
+
+    def instrument_http(self):
+        # Every Discord REST call goes through HTTPClient.request; label by route template
+        request = self.http.request
+
+        async def timed_request(route, **kwargs):
+            async with observe_external("discord", f"{route.method} {route.path}"):
+                return await request(route, **kwargs)
+
+        self.http.request = timed_request
+
+
+bot = LPBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.metrics_started = time.perf_counter()
+    COMMANDS_IN_FLIGHT.inc(ctx.command.qualified_name)
+
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    name = ctx.command.qualified_name
+    guild = str(ctx.guild.id) if ctx.guild else "dm"
+    COMMANDS_IN_FLIGHT.dec(name)
+    COMMAND_SECONDS.observe(name, guild, value=time.perf_counter() - ctx.metrics_started)
+    # Handlers that catch their own exceptions and reply "Error: ..." set command_failed themselves
+    COMMANDS_TOTAL.inc(name, guild, "error" if ctx.command_failed else "ok")
+
+# === HTTP CLIENTS ===
+# One pooled, keep-alive client per stack, created once and closed on
+# shutdown, so repeated calls reuse connections instead of paying for a new
+# TCP+TLS handshake each time. spotipy (blocking) gets a requests.Session
+# sized to the Spotify worker pool; OpenAI and CDN downloads share an
+# aiohttp.ClientSession.
+SPOTIFY_WORKERS = int(os.getenv("SPOTIFY_WORKERS", "8"))
+SPOTIFY_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT", "10"))  # seconds
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", "4"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "60"))  # seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))  # image generation is slow
+
+
+def build_spotify_http():
+    session = requests.Session()
+    session.verify = certifi.where()
+    # 429s are left to SpotifyScheduler instead of being retried (and slept on) in a worker thread
+    # (respect_retry_after_header=False, otherwise urllib3 retries any 429 that carries Retry-After)
+    retry = Retry(total=3, connect=3, read=0, status=3, backoff_factor=0.3,
+                  status_forcelist=(500, 502, 503, 504), allowed_methods=False,
+                  respect_retry_after_header=False)
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=SPOTIFY_WORKERS, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)  # local stand-in API (SPOTIFY_API_URL)
+    return session
+
+
+class HttpClients:
+    def __init__(self):
+        self.session = None
+
+    def get(self):
+        # Created lazily inside the running loop; reused for the life of the bot
+        if self.session is None or self.session.closed:
+            ssl_context = ssl.create_default_context(cafile=certifi.where())
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                limit_per_host=HTTP_POOL_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE,
+                ssl=ssl_context,
+            )
+            timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+spotify_http = build_spotify_http()
+http_clients = HttpClients()
 
 # === SPOTIFY AUTH ===
-sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-    client_id=SPOTIFY_CLIENT_ID,
-    client_secret=SPOTIFY_CLIENT_SECRET,
-    redirect_uri=SPOTIFY_REDIRECT_URI,
-    scope="ugc-image-upload playlist-modify-public playlist-modify-private"
-))
+# SPOTIFY_API_URL points the client at a local stand-in (benchmarks/fake_spotify.py)
+# for load and fault testing; it accepts any bearer token, so OAuth is skipped.
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL")
+SPOTIFY_STATIC_TOKEN = os.getenv("SPOTIFY_STATIC_TOKEN", "local")
+
+if SPOTIFY_API_URL:
+    sp = spotipy.Spotify(auth=SPOTIFY_STATIC_TOKEN, requests_session=spotify_http, requests_timeout=SPOTIFY_TIMEOUT)
+    sp.prefix = SPOTIFY_API_URL.rstrip("/") + "/"
+    print(f"[INFO] Using Spotify API at {sp.prefix}")
+else:
+    sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
+        client_id=SPOTIFY_CLIENT_ID,
+        client_secret=SPOTIFY_CLIENT_SECRET,
+        redirect_uri=SPOTIFY_REDIRECT_URI,
+        scope="ugc-image-upload playlist-modify-public playlist-modify-private",
+        requests_session=spotify_http,
+        requests_timeout=SPOTIFY_TIMEOUT,
+    ), requests_session=spotify_http, requests_timeout=SPOTIFY_TIMEOUT)
+
+# === SPOTIFY REQUEST SCHEDULER ===
+# Every outgoing Spotify call goes through one scheduler: a token bucket keeps
+# us under SPOTIFY_RATE requests/second, a 429 pauses everything for the
+# Retry-After period, and queued calls are dispatched by priority so
+# interactive commands never wait behind status paging or background work.
+SPOTIFY_RATE = float(os.getenv("SPOTIFY_RATE", "10"))  # requests per second
+SPOTIFY_BURST = int(os.getenv("SPOTIFY_BURST", "20"))
+SPOTIFY_MAX_REQUEUES = int(os.getenv("SPOTIFY_MAX_REQUEUES", "5"))  # 429s a single call may sit out before failing
+
+PRIORITY_INTERACTIVE = 0  # !add / !remove / !reset writes, track lookups
+PRIORITY_STATUS = 1  # playlist paging for !status / !remove / !reset
+PRIORITY_BACKGROUND = 2  # art uploads, mirror reconciliation
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_STATUS: "status",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class SpotifyScheduler:
+    def __init__(self, rate=SPOTIFY_RATE, burst=SPOTIFY_BURST, max_in_flight=SPOTIFY_WORKERS):
+        self.rate = rate
+        self.max_in_flight = max_in_flight  # one per AsyncSpotify worker thread
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.heap = []  # (priority, seq, enqueued_at, call, future, endpoint, requeues)
+        self.seq = itertools.count()
+        self.wakeup = None
+        self.task = None
+        self.running = set()
+        self.throttled = 0
+        self.stats_by_priority = {p: {"calls": 0, "total_wait": 0.0, "max_wait": 0.0} for p in PRIORITY_NAMES}
+
+    def _start(self):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def submit(self, priority, call, endpoint="call"):
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.heap, (priority, next(self.seq), time.monotonic(), call, future, endpoint, 0))
+        self.wakeup.set()
+        return await future
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    async def _run(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            now = self._refill()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            # Hold calls here until a worker thread is free; once handed to the
+            # pool they would wait in its FIFO queue, ignoring priority and backoff
+            if len(self.running) >= self.max_in_flight:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            # Pop only once a token is available so a late high-priority call still goes first
+            self.tokens -= 1
+            item = heapq.heappop(self.heap)
+            if item[4].done():  # caller gave up
+                continue
+            task = asyncio.create_task(self._execute(item))
+            self.running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self.running.discard(task)
+        self.wakeup.set()
+
+    async def _execute(self, item):
+        priority, seq, enqueued_at, call, future, endpoint, requeues = item
+        wait = time.monotonic() - enqueued_at
+        started = time.perf_counter()
+        EXTERNAL_IN_FLIGHT.inc("spotify")
+        try:
+            result = await call()
+        except spotipy.SpotifyException as e:
+            EXTERNAL_IN_FLIGHT.dec("spotify")
+            # spotipy also reports exhausted 5xx retries as a 429, but without
+            # headers; only a real rate limit carries Retry-After
+            retry_after = (e.headers or {}).get("Retry-After") if e.http_status == 429 else None
+            record_external("spotify", endpoint, "throttled" if retry_after is not None else "error", started)
+            if retry_after is not None and requeues < SPOTIFY_MAX_REQUEUES:
+                retry_after = float(retry_after)
+                self.throttled += 1
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                print(f"[WARN] Spotify rate limited us, backing off for {retry_after:.0f}s")
+                # Requeue with the original seq so it keeps its place in line
+                heapq.heappush(self.heap, item[:6] + (requeues + 1,))
+                self.wakeup.set()
+                return
+            if not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            EXTERNAL_IN_FLIGHT.dec("spotify")
+            record_external("spotify", endpoint, "error", started)
+            if not future.done():
+                future.set_exception(e)
+        else:
+            EXTERNAL_IN_FLIGHT.dec("spotify")
+            record_external("spotify", endpoint, "ok", started)
+            if not future.done():
+                future.set_result(result)
+
+        stats = self.stats_by_priority[priority]
+        stats["calls"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def stats(self):
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for item in self.heap:
+            depth[PRIORITY_NAMES[item[0]]] += 1
+        waits = {}
+        for priority, stats in self.stats_by_priority.items():
+            avg = stats["total_wait"] / stats["calls"] if stats["calls"] else 0.0
+            waits[PRIORITY_NAMES[priority]] = {"calls": stats["calls"], "avg_wait": avg, "max_wait": stats["max_wait"]}
+        return {
+            "queue_depth": depth,
+            "waits": waits,
+            "in_flight": len(self.running),
+            "throttled": self.throttled,
+            "backoff_remaining": max(0.0, self.blocked_until - time.monotonic()),
+        }
+
+    def shutdown(self):
+        if self.task is not None:
+            self.task.cancel()
+        for item in self.heap:
+            item[4].cancel()
+        self.heap.clear()
+
+
+spotify_scheduler = SpotifyScheduler()
+SPOTIFY_QUEUE_DEPTH = metrics.gauge("lpbot_spotify_queue_depth", "Spotify calls waiting for a rate limit token", ("priority",))
+
+
+def collect_spotify_queue():
+    for name, depth in spotify_scheduler.stats()["queue_depth"].items():
+        SPOTIFY_QUEUE_DEPTH.set(name, value=depth)
+
+
+metrics.collectors.append(collect_spotify_queue)
+
+# === ASYNC SPOTIFY CLIENT ===
+# spotipy is blocking, so every call is pushed onto a bounded thread pool.
+# Commands go through `spotify` instead of `sp` so one slow Spotify response
+# never stalls the event loop (heartbeats, other guilds, other commands).
+
+
+class AsyncSpotify:
+    def __init__(self, client, max_workers=SPOTIFY_WORKERS):
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spotify")
+
+    async def run(self, func, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        endpoint = getattr(func, "__name__", "call")
+        return await spotify_scheduler.submit(priority, lambda: loop.run_in_executor(self.executor, call), endpoint)
+
+    async def call(self, method, *args, **kwargs):
+        return await self.run(getattr(self.client, method), *args, **kwargs)
+
+    def __getattr__(self, name):
+        # spotify.search(...) -> awaitable sp.search(...) on the pool
+        async def method(*args, **kwargs):
+            return await self.call(name, *args, **kwargs)
+        return method
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+spotify = AsyncSpotify(sp)
 
 # === TRACKING ===
 SUBMISSIONS_FILE = "user_submissions.json"
 PLAYLIST_MAP_FILE = "playlist_map.json"
 QUOTA_FILE = "submission_quotas.json"
 LIMIT_FILE = "duration_limits.json"
+ALLTIME_FILE = "alltime_counts.json"
 MAX_DURATION_MS = 7 * 60 * 1000
 
-if os.path.exists(SUBMISSIONS_FILE):
-    with open(SUBMISSIONS_FILE, "r") as f:
-        user_submissions = json.load(f)
+# === WRITE-BEHIND PERSISTENCE ===
+# Saves are coalesced: callers only mark a file dirty and a background task
+# writes each dirty file at most once per FLUSH_INTERVAL seconds. Every write
+# goes to a temp file that is fsynced and renamed over the original, so a crash
+# mid-write leaves the previous version intact.
+FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL", "5"))
 
-else: 
-    user_submissions = {}
 
-print(f"[DEBUG] Loaded submissions: {json.dumps(user_submissions, indent=2)}")
+def atomic_write_text(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
-try:
-    with open(PLAYLIST_MAP_FILE, "r") as f:
-        playlist_map = json.load(f)
-except Exception as e:
-    print(f"[ERROR] Could not load playlist_map.json: {e}")
-    playlist_map = {}
 
-if os.path.exists(QUOTA_FILE):
-    with open(QUOTA_FILE, "r") as f:
-        submission_quotas = json.load(f)
-else:
-    submission_quotas = {}
+def atomic_write_json(path, data, indent=None):
+    atomic_write_text(path, json.dumps(data, indent=indent))
 
-if os.path.exists(LIMIT_FILE):
-    with open(LIMIT_FILE, "r") as f:
-        duration_limits = json.load(f)
-else:
-    duration_limits = {}
 
-if os.path.exists(ART_SETTING_FILE):
-    with open(ART_SETTING_FILE, "r") as f:
-        art_settings = json.load(f)
+class PersistenceManager:
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self.sources = {}  # path: (get_data, indent)
+        self.dirty = set()
+        self.task = None
+        self.flushing = None
+        self.marks = 0
+        self.writes = 0
+
+    def register(self, path, get_data, indent=None):
+        self.sources[path] = (get_data, indent)
+
+    def mark_dirty(self, path):
+        self.marks += 1
+        self.dirty.add(path)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # Shielded so stop() only cancels the sleep and waits for a flush already writing
+            self.flushing = asyncio.create_task(self.flush())
+            await asyncio.shield(self.flushing)
+
+    def _snapshot(self):
+        # Serialize on the event loop so no command can mutate a dict mid-dump
+        dirty, self.dirty = self.dirty, set()
+        snapshots = []
+        for path in dirty:
+            get_data, indent = self.sources[path]
+            snapshots.append((path, json.dumps(get_data(), indent=indent)))
+        return snapshots
+
+    async def flush(self):
+        loop = asyncio.get_running_loop()
+        pending = self._snapshot()
+        try:
+            while pending:
+                path, text = pending[0]
+                try:
+                    await loop.run_in_executor(None, atomic_write_text, path, text)
+                    self.writes += 1
+                except Exception as e:
+                    print(f"[ERROR] Failed to write {path}: {e}")
+                    self.dirty.add(path)
+                pending.pop(0)
+        finally:
+            # Anything not written yet (e.g. cancelled mid-flush) goes back to dirty
+            self.dirty.update(path for path, _ in pending)
+
+    def flush_now(self):
+        for path, text in self._snapshot():
+            try:
+                atomic_write_text(path, text)
+                self.writes += 1
+            except Exception as e:
+                print(f"[ERROR] Failed to write {path}: {e}")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.flushing is not None and not self.flushing.done():
+            await self.flushing
+        self.flush_now()
+
+
+persistence = PersistenceManager()
+
+# === STORAGE ===
+# All bot state lives in memory as plain dicts (same shapes as the old JSON
+# files). Commands mutate those dicts and then tell `store` about the single
+# row that changed. "sqlite" (default) persists rows in a WAL-mode database;
+# "json" keeps the legacy one-file-per-dict layout.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+DATABASE_FILE = os.getenv("DATABASE_FILE", "lpbot.db")
+
+PERMISSION_ROLES = ["administrators", "organizers", "users"]
+
+
+def read_json_file(path):
+    if not os.path.exists(path):
+        print(f"[INFO] No {path} found, starting fresh.")
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"[ERROR] Failed to parse {path}: {e}")
+        os.rename(path, path + ".bak")
+        print(f"[INFO] Corrupted {path} backed up.")
+        return {}
+
+
+class JsonStore:
+    FILES = {
+        "user_submissions": SUBMISSIONS_FILE,
+        "playlist_map": PLAYLIST_MAP_FILE,
+        "submission_quotas": QUOTA_FILE,
+        "duration_limits": LIMIT_FILE,
+        "art_settings": ART_SETTING_FILE,
+        "permissions": PERMISSIONS_FILE,
+        "alltime_counts": ALLTIME_FILE,
+    }
+
+    def __init__(self, persistence=None):
+        self.data = {}
+        self.persistence = persistence
+
+    def load(self):
+        self.data = {name: read_json_file(path) for name, path in self.FILES.items()}
+        if self.persistence is not None:
+            for name, path in self.FILES.items():
+                indent = 4 if name == "permissions" else None
+                self.persistence.register(path, functools.partial(self.data.get, name), indent)
+        return self.data
+
+    def _save(self, name):
+        if self.persistence is not None:
+            self.persistence.mark_dirty(self.FILES[name])
+        else:
+            atomic_write_json(self.FILES[name], self.data[name], indent=4 if name == "permissions" else None)
+
+    def add_submission(self, gid, playlist_id, user_id, track_id):
+        self._save("user_submissions")
+
+    def remove_submission(self, gid, playlist_id, user_id, track_id):
+        self._save("user_submissions")
+
+    def clear_submissions(self, gid, playlist_id):
+        self._save("user_submissions")
+
+    def set_playlist(self, channel, playlist_id):
+        self._save("playlist_map")
+
+    def set_quota(self, gid, cid, quota):
+        self._save("submission_quotas")
+
+    def set_limit(self, gid, cid, minutes):
+        self._save("duration_limits")
+
+    def set_art(self, gid, cid, enabled):
+        self._save("art_settings")
+
+    def add_permission(self, gid, role, user_id):
+        self._save("permissions")
+
+    def set_guild_setting(self, gid, key, value):
+        self._save("permissions")
+
+    def ensure_guilds(self, gids):
+        self._save("permissions")
+
+    def set_alltime(self, gid, user_id, count):
+        self._save("alltime_counts")
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id TEXT NOT NULL,
+        playlist_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        track_id TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_submissions_user ON submissions (guild_id, playlist_id, user_id);
+    CREATE INDEX IF NOT EXISTS idx_submissions_track ON submissions (guild_id, playlist_id, track_id);
+    CREATE TABLE IF NOT EXISTS playlist_map (
+        channel TEXT PRIMARY KEY,
+        playlist_id TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS submission_quotas (
+        guild_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        quota INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, channel_id)
+    );
+    CREATE TABLE IF NOT EXISTS duration_limits (
+        guild_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        minutes INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, channel_id)
+    );
+    CREATE TABLE IF NOT EXISTS art_settings (
+        guild_id TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        enabled INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, channel_id)
+    );
+    CREATE TABLE IF NOT EXISTS permissions (
+        guild_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        PRIMARY KEY (guild_id, role, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS guild_settings (
+        guild_id TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT,
+        PRIMARY KEY (guild_id, key)
+    );
+    CREATE TABLE IF NOT EXISTS alltime_counts (
+        guild_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    );
+    """
+
+    def __init__(self, path=DATABASE_FILE):
+        self.path = path
+        # Autocommit: every row-level write below is its own small transaction
+        # timeout: cluster workers share the file, so wait out each other's write locks
+        self.conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.writer = None
+        self.write_conn = None
+
+    def load(self):
+        if self.get_meta("json_migrated") is None:
+            migrate_json_to_sqlite(self)
+        self._start_writer()
+
+        data = {
+            "user_submissions": {},
+            "playlist_map": {},
+            "submission_quotas": {},
+            "duration_limits": {},
+            "art_settings": {},
+            "permissions": {},
+            "alltime_counts": {},
+        }
+        rows = self.conn.execute("SELECT guild_id, playlist_id, user_id, track_id FROM submissions ORDER BY id")
+        for gid, playlist_id, user_id, track_id in rows:
+            data["user_submissions"].setdefault(gid, {}).setdefault(playlist_id, {}).setdefault(user_id, []).append(track_id)
+        for channel, playlist_id in self.conn.execute("SELECT channel, playlist_id FROM playlist_map"):
+            data["playlist_map"][channel] = playlist_id
+        for gid, cid, quota in self.conn.execute("SELECT guild_id, channel_id, quota FROM submission_quotas"):
+            data["submission_quotas"].setdefault(gid, {})[cid] = quota
+        for gid, cid, minutes in self.conn.execute("SELECT guild_id, channel_id, minutes FROM duration_limits"):
+            data["duration_limits"].setdefault(gid, {})[cid] = minutes
+        for gid, cid, enabled in self.conn.execute("SELECT guild_id, channel_id, enabled FROM art_settings"):
+            data["art_settings"].setdefault(gid, {})[cid] = bool(enabled)
+        for gid, role, user_id in self.conn.execute("SELECT guild_id, role, user_id FROM permissions ORDER BY rowid"):
+            data["permissions"].setdefault(gid, {}).setdefault(role, []).append(user_id)
+        for gid, key, value in self.conn.execute("SELECT guild_id, key, value FROM guild_settings"):
+            data["permissions"].setdefault(gid, {})[key] = value
+        for gid, user_id, count in self.conn.execute("SELECT guild_id, user_id, count FROM alltime_counts"):
+            data["alltime_counts"].setdefault(gid, {})[user_id] = count
+        return data
+
+    def _start_writer(self):
+        # After loading, writes go to one background thread with its own
+        # connection, in order. Waiting out another cluster worker's write
+        # lock then blocks that thread instead of the event loop.
+        if self.writer is None:
+            self.write_conn = sqlite3.connect(self.path, isolation_level=None, timeout=30, check_same_thread=False)
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+
+    def _write(self, sql, params=()):
+        if self.writer is None:
+            # Still loading (JSON migration runs inside one transaction on self.conn)
+            self.conn.execute(sql, params)
+        else:
+            self.writer.submit(self._write_now, sql, params)
+
+    def _write_now(self, sql, params):
+        try:
+            self.write_conn.execute(sql, params)
+        except sqlite3.Error as e:
+            print(f"[ERROR] Failed to write to {self.path}: {e}")
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self._write("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def add_submission(self, gid, playlist_id, user_id, track_id):
+        self._write(
+            "INSERT INTO submissions (guild_id, playlist_id, user_id, track_id) VALUES (?, ?, ?, ?)",
+            (gid, playlist_id, user_id, track_id))
+
+    def remove_submission(self, gid, playlist_id, user_id, track_id):
+        self._write(
+            "DELETE FROM submissions WHERE id = (SELECT MIN(id) FROM submissions "
+            "WHERE guild_id = ? AND playlist_id = ? AND user_id = ? AND track_id = ?)",
+            (gid, playlist_id, user_id, track_id))
+
+    def clear_submissions(self, gid, playlist_id):
+        self._write("DELETE FROM submissions WHERE guild_id = ? AND playlist_id = ?", (gid, playlist_id))
+
+    def set_playlist(self, channel, playlist_id):
+        self._write("INSERT OR REPLACE INTO playlist_map (channel, playlist_id) VALUES (?, ?)", (channel, playlist_id))
+
+    def set_quota(self, gid, cid, quota):
+        self._write(
+            "INSERT OR REPLACE INTO submission_quotas (guild_id, channel_id, quota) VALUES (?, ?, ?)", (gid, cid, quota))
+
+    def set_limit(self, gid, cid, minutes):
+        self._write(
+            "INSERT OR REPLACE INTO duration_limits (guild_id, channel_id, minutes) VALUES (?, ?, ?)", (gid, cid, minutes))
+
+    def set_art(self, gid, cid, enabled):
+        self._write(
+            "INSERT OR REPLACE INTO art_settings (guild_id, channel_id, enabled) VALUES (?, ?, ?)", (gid, cid, int(enabled)))
+
+    def add_permission(self, gid, role, user_id):
+        self._write("INSERT OR IGNORE INTO permissions (guild_id, role, user_id) VALUES (?, ?, ?)", (gid, role, user_id))
+
+    def set_guild_setting(self, gid, key, value):
+        self._write(
+            "INSERT OR REPLACE INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?)", (gid, key, value))
+
+    def ensure_guilds(self, gids):
+        # Empty role lists are implicit in the row layout
+        pass
+
+    def set_alltime(self, gid, user_id, count):
+        if count:
+            self._write(
+                "INSERT OR REPLACE INTO alltime_counts (guild_id, user_id, count) VALUES (?, ?, ?)", (gid, user_id, count))
+        else:
+            self._write("DELETE FROM alltime_counts WHERE guild_id = ? AND user_id = ?", (gid, user_id))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.shutdown(wait=True)  # let queued writes land
+            self.write_conn.close()
+            self.writer = None
+        self.conn.close()
+
+
+def migrate_json_to_sqlite(store):
+    # One-shot import of the legacy JSON files the first time the database is opened
+    legacy = JsonStore().load()
+    conn = store.conn
+    conn.execute("BEGIN IMMEDIATE")
+    if store.get_meta("json_migrated") is not None:
+        # Another process got there first
+        conn.execute("ROLLBACK")
+        return
+    try:
+        for gid, playlists in legacy["user_submissions"].items():
+            for playlist_id, users in playlists.items():
+                for user_id, track_ids in users.items():
+                    conn.executemany(
+                        "INSERT INTO submissions (guild_id, playlist_id, user_id, track_id) VALUES (?, ?, ?, ?)",
+                        [(gid, playlist_id, user_id, track_id) for track_id in track_ids])
+        for channel, playlist_id in legacy["playlist_map"].items():
+            store.set_playlist(channel, playlist_id)
+        for gid, channels in legacy["submission_quotas"].items():
+            for cid, quota in channels.items():
+                store.set_quota(gid, cid, quota)
+        for gid, channels in legacy["duration_limits"].items():
+            for cid, minutes in channels.items():
+                store.set_limit(gid, cid, minutes)
+        for gid, channels in legacy["art_settings"].items():
+            for cid, enabled in channels.items():
+                store.set_art(gid, cid, enabled)
+        for gid, guild_perms in legacy["permissions"].items():
+            for key, value in guild_perms.items():
+                if key in PERMISSION_ROLES:
+                    for user_id in value:
+                        store.add_permission(gid, key, user_id)
+                else:
+                    store.set_guild_setting(gid, key, value)
+        for gid, users in legacy["alltime_counts"].items():
+            for user_id, count in users.items():
+                store.set_alltime(gid, user_id, count)
+        store.set_meta("json_migrated", datetime.now().isoformat())
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    migrated = sum(len(t) for p in legacy["user_submissions"].values() for u in p.values() for t in u.values())
+    print(f"[INFO] Migrated JSON data into {store.path} ({migrated} submissions).")
+
+
+if STORAGE_BACKEND == "json":
+    store = JsonStore(persistence)
 else:
-    art_settings = {}
+    store = SqliteStore(DATABASE_FILE)
+
+_state = store.load()
+user_submissions = _state["user_submissions"]
+playlist_map = _state["playlist_map"]
+submission_quotas = _state["submission_quotas"]
+duration_limits = _state["duration_limits"]
+art_settings = _state["art_settings"]
+permissions = _state["permissions"]
+alltime_counts = _state["alltime_counts"]
+
+print(f"[DEBUG] Loaded submissions: {json.dumps(user_submissions, indent=2)}")
+
+# === SUBMISSION INDEX ===
+# user_submissions is grouped by user, which makes "was this track already
+# submitted?" and "who submitted it?" a scan over every user's list. The index
+# keeps track_id -> submitter and per-user counts for each playlist so those
+# checks are constant time. Always mutate submissions through the helpers
+# below so the dicts, the index and the store stay in sync.
+class SubmissionIndex:
+    def __init__(self):
+        self.owners = {}  # (gid, playlist_id): {track_id: user_id}
+        self.counts = {}  # (gid, playlist_id): {user_id: count}
+
+    def build(self, submissions):
+        self.owners.clear()
+        self.counts.clear()
+        for gid, playlists in submissions.items():
+            for playlist_id, users in playlists.items():
+                for user_id, track_ids in users.items():
+                    for track_id in track_ids:
+                        self.add(gid, playlist_id, user_id, track_id)
+
+    def add(self, gid, playlist_id, user_id, track_id):
+        key = (gid, playlist_id)
+        self.owners.setdefault(key, {}).setdefault(track_id, user_id)
+        counts = self.counts.setdefault(key, {})
+        counts[user_id] = counts.get(user_id, 0) + 1
+
+    def remove(self, gid, playlist_id, user_id, track_id):
+        key = (gid, playlist_id)
+        owners = self.owners.get(key, {})
+        if owners.get(track_id) == user_id:
+            del owners[track_id]
+        counts = self.counts.get(key, {})
+        if counts.get(user_id, 0) > 1:
+            counts[user_id] -= 1
+        else:
+            counts.pop(user_id, None)
+
+    def clear(self, gid, playlist_id):
+        self.owners.pop((gid, playlist_id), None)
+        self.counts.pop((gid, playlist_id), None)
+
+    def owner(self, gid, playlist_id, track_id):
+        return self.owners.get((gid, playlist_id), {}).get(track_id)
+
+    def count(self, gid, playlist_id, user_id):
+        return self.counts.get((gid, playlist_id), {}).get(user_id, 0)
+
+
+submission_index = SubmissionIndex()
+submission_index.build(user_submissions)
+
+# === LEADERBOARDS ===
+# Contribution counts per playlist, per guild (summed over its playlists) and
+# all-time per guild. The all-time board is persisted and is not touched by
+# !reset; !remove still takes a track back off it. Each board keeps its
+# entries sorted, so top N is a slice and a user's rank a binary search.
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "15"))
+
+
+class RankedCounter:
+    def __init__(self):
+        self.counts = {}  # user_id: count
+        self.order = []  # (-count, user_id), ascending = highest count first
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, user_id, delta):
+        old = self.counts.get(user_id, 0)
+        new = max(0, old + delta)
+        if old:
+            del self.order[bisect.bisect_left(self.order, (-old, user_id))]
+        if new:
+            self.counts[user_id] = new
+            bisect.insort(self.order, (-new, user_id))
+        else:
+            self.counts.pop(user_id, None)
+        return new
+
+    def top(self, n):
+        return [(user_id, -negative) for negative, user_id in self.order[:n]]
+
+    def rank(self, user_id):
+        count = self.counts.get(user_id)
+        if not count:
+            return None
+        return bisect.bisect_left(self.order, (-count, user_id)) + 1
+
+
+class Leaderboards:
+    def __init__(self):
+        self.playlists = {}  # (gid, playlist_id): RankedCounter
+        self.guilds = {}  # gid: RankedCounter
+        self.alltime = {}  # gid: RankedCounter
+
+    def build(self, submissions, alltime):
+        self.playlists.clear()
+        self.guilds.clear()
+        self.alltime.clear()
+        for gid, playlists in submissions.items():
+            for playlist_id, users in playlists.items():
+                for user_id, track_ids in users.items():
+                    self._bump(self.playlists, (gid, playlist_id), user_id, len(track_ids))
+                    self._bump(self.guilds, gid, user_id, len(track_ids))
+        for gid, users in alltime.items():
+            for user_id, count in users.items():
+                self._bump(self.alltime, gid, user_id, count)
+
+    @staticmethod
+    def _bump(boards, key, user_id, delta):
+        board = boards.get(key)
+        if board is None:
+            if delta <= 0:
+                return 0
+            board = boards[key] = RankedCounter()
+        count = board.add(user_id, delta)
+        if not board:
+            del boards[key]
+        return count
+
+    def add(self, gid, playlist_id, user_id, delta):
+        # Returns the user's new all-time count so the caller can persist it
+        self._bump(self.playlists, (gid, playlist_id), user_id, delta)
+        self._bump(self.guilds, gid, user_id, delta)
+        return self._bump(self.alltime, gid, user_id, delta)
+
+    def clear(self, gid, playlist_id):
+        board = self.playlists.pop((gid, playlist_id), None)
+        if board is not None:
+            for user_id, count in board.counts.items():
+                self._bump(self.guilds, gid, user_id, -count)
+
+    def seed_alltime(self):
+        # All-time can never be below what a user has in the guild right now;
+        # this also seeds it from existing submissions the first time round.
+        # Returns the (gid, user_id, count) entries that were raised.
+        raised = []
+        for gid, board in self.guilds.items():
+            for user_id, count in board.counts.items():
+                current = self.alltime[gid].counts.get(user_id, 0) if gid in self.alltime else 0
+                if current < count:
+                    self._bump(self.alltime, gid, user_id, count - current)
+                    raised.append((gid, user_id, count))
+        return raised
+
+    def board(self, scope, gid, playlist_id=None):
+        if scope == "alltime":
+            return self.alltime.get(gid)
+        if scope == "guild":
+            return self.guilds.get(gid)
+        return self.playlists.get((gid, playlist_id))
+
+
+def set_alltime_count(gid, user_id, count):
+    if count:
+        alltime_counts.setdefault(gid, {})[user_id] = count
+    else:
+        alltime_counts.get(gid, {}).pop(user_id, None)
+    store.set_alltime(gid, user_id, count)
+
+
+leaderboards = Leaderboards()
+leaderboards.build(user_submissions, alltime_counts)
+for _gid, _user_id, _count in leaderboards.seed_alltime():
+    set_alltime_count(_gid, _user_id, _count)
+
+
+def record_submission(gid, playlist_id, user_id, track_id):
+    user_submissions.setdefault(gid, {}).setdefault(playlist_id, {}).setdefault(user_id, []).append(track_id)
+    submission_index.add(gid, playlist_id, user_id, track_id)
+    store.add_submission(gid, playlist_id, user_id, track_id)
+    set_alltime_count(gid, user_id, leaderboards.add(gid, playlist_id, user_id, 1))
+
+
+def drop_submission(gid, playlist_id, user_id, track_id):
+    user_submissions[gid][playlist_id][user_id].remove(track_id)
+    submission_index.remove(gid, playlist_id, user_id, track_id)
+    store.remove_submission(gid, playlist_id, user_id, track_id)
+    set_alltime_count(gid, user_id, leaderboards.add(gid, playlist_id, user_id, -1))
+
+
+def clear_submissions(gid, playlist_id):
+    if gid in user_submissions and playlist_id in user_submissions[gid]:
+        del user_submissions[gid][playlist_id]
+        if not user_submissions[gid]:  # cleanup if empty
+            del user_submissions[gid]
+    submission_index.clear(gid, playlist_id)
+    leaderboards.clear(gid, playlist_id)
+    store.clear_submissions(gid, playlist_id)
+
+# === TRACK CACHE ===
+# Track metadata keyed by normalized search query and by track ID, so repeated
+# !add attempts for the same song (or the same fmbot reply) are answered locally.
+TRACK_CACHE_FILE = cluster_path("track_cache.json")
+TRACK_CACHE_SIZE = int(os.getenv("TRACK_CACHE_SIZE", "5000"))
+TRACK_CACHE_TTL = int(os.getenv("TRACK_CACHE_TTL", str(24 * 60 * 60)))  # seconds
+TRACK_CACHE_PERSIST = os.getenv("TRACK_CACHE_PERSIST", "1") == "1"
+
+
+def slim_track(track):
+    # Only keep the fields the bot actually reads; full track objects carry
+    # large available_markets lists we don't need in memory or on disk.
+    album = track.get("album") or {}
+    return {
+        "id": track["id"],
+        "name": track["name"],
+        "duration_ms": track["duration_ms"],
+        "artists": [{"name": a["name"]} for a in track.get("artists", [])[:1]],
+        "album": {"name": album.get("name"), "images": album.get("images", [])[:1]},
+        "external_urls": {"spotify": track.get("external_urls", {}).get("spotify")},
+    }
+
+
+class TrackCache:
+    def __init__(self, max_size=TRACK_CACHE_SIZE, ttl=TRACK_CACHE_TTL, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()  # key: (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_query(query):
+        return " ".join(query.lower().split())
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        self.entries[key] = (time.time() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get_track(self, track_id):
+        track = self._get(f"id:{track_id}")
+        if track is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return track
+
+    def get_query(self, query):
+        # Query entries point at a track ID so each track is stored once
+        track_id = self._get(f"q:{self.normalize_query(query)}")
+        track = self._get(f"id:{track_id}") if track_id else None
+        if track is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return track
+
+    def put_track(self, track, query=None):
+        track = slim_track(track)
+        self._put(f"id:{track['id']}", track)
+        if query:
+            self._put(f"q:{self.normalize_query(query)}", track["id"])
+        return track
+
+    def purge_expired(self):
+        now = time.time()
+        expired = [key for key, (expires_at, _) in self.entries.items() if expires_at < now]
+        for key in expired:
+            del self.entries[key]
+        return len(expired)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            now = time.time()
+            for key, (expires_at, value) in data.items():
+                if expires_at > now:
+                    self.entries[key] = (expires_at, value)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            print(f"[INFO] Loaded {len(self.entries)} cached track entries.")
+        except Exception as e:
+            print(f"[ERROR] Could not load {self.path}: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            atomic_write_json(self.path, self.entries)
+        except Exception as e:
+            print(f"[ERROR] Could not save {self.path}: {e}")
+
+
+track_cache = TrackCache(path=TRACK_CACHE_FILE if TRACK_CACHE_PERSIST else None)
+track_cache.load()
+
+# === MEMBER NAMES ===
+# Resolves display names for !status / !leaderboard without one fetch_member
+# per user: the gateway member cache first, then a TTL cache, then chunked
+# query_members requests (up to 100 IDs each) for whatever is left.
+MEMBER_NAME_TTL = int(os.getenv("MEMBER_NAME_TTL", str(10 * 60)))  # seconds
+MEMBER_QUERY_CHUNK = 100
+UNKNOWN_MEMBER = "👻 Unknown User"
+
+
+class MemberNameResolver:
+    def __init__(self, ttl=MEMBER_NAME_TTL):
+        self.ttl = ttl
+        self.names = {}  # (gid, user_id): (expires_at, name)
+        self.queries = 0
+
+    async def resolve(self, guild, user_ids):
+        gid = str(guild.id)
+        now = time.time()
+        names = {}
+        misses = []
+
+        for user_id in dict.fromkeys(str(u) for u in user_ids):
+            member = guild.get_member(int(user_id))
+            if member is not None:
+                names[user_id] = member.display_name
+                continue
+            cached = self.names.get((gid, user_id))
+            if cached and cached[0] > now:
+                names[user_id] = cached[1]
+            else:
+                misses.append(user_id)
+
+        for i in range(0, len(misses), MEMBER_QUERY_CHUNK):
+            chunk = misses[i:i + MEMBER_QUERY_CHUNK]
+            try:
+                self.queries += 1
+                members = await guild.query_members(user_ids=[int(u) for u in chunk], limit=len(chunk), cache=True)
+            except Exception as e:
+                # Show the placeholder this time but don't cache it; a failed query says nothing about who left
+                print(f"[ERROR] Failed to query members: {e}")
+                names.update((user_id, UNKNOWN_MEMBER) for user_id in chunk)
+                continue
+            found = {str(m.id): m.display_name for m in members}
+            for user_id in chunk:
+                # Cache misses too, so users who left don't get re-queried every time
+                name = found.get(user_id, UNKNOWN_MEMBER)
+                self.names[(gid, user_id)] = (now + self.ttl, name)
+                names[user_id] = name
+
+        return names
+
+    def invalidate(self, guild_id, user_id):
+        self.names.pop((str(guild_id), str(user_id)), None)
+
+    def purge_expired(self):
+        now = time.time()
+        expired = [key for key, (expires_at, _) in self.names.items() if expires_at < now]
+        for key in expired:
+            del self.names[key]
+        return len(expired)
+
+
+member_names = MemberNameResolver()
+
+# === REPLY RESOLUTION ===
+# !add can be used as a reply to an fmbot "now playing" embed. The replied
+# message is taken from message.reference.resolved or the client's message
+# cache, and the parsed result is kept in a small LRU shared by on_message and
+# add_to_playlist, so a REST fetch only happens on a true miss.
+FMBOT_REPLY_CACHE_SIZE = int(os.getenv("FMBOT_REPLY_CACHE_SIZE", "512"))
+FMBOT_TRACK_RE = re.compile(r"\[([^\]]+)\]\(")
+FMBOT_ARTIST_RE = re.compile(r"\*\*(.*?)\*\*")
+
+
+def parse_fmbot_embed(message):
+    if not message.embeds:
+        return None
+    desc = message.embeds[0].description or ""
+    track_match = FMBOT_TRACK_RE.search(desc)
+    artist_match = FMBOT_ARTIST_RE.search(desc)
+    if track_match and artist_match:
+        return f"{track_match.group(1).strip()} - {artist_match.group(1).strip()}"
+    return None
+
+
+class ReplyResolver:
+    def __init__(self, max_size=FMBOT_REPLY_CACHE_SIZE):
+        self.max_size = max_size
+        self.parsed = OrderedDict()  # message_id: song query, or None for non-fmbot messages
+        self.hits = 0
+        self.fetches = 0
+
+    def _store(self, message_id, query):
+        self.parsed[message_id] = query
+        self.parsed.move_to_end(message_id)
+        while len(self.parsed) > self.max_size:
+            self.parsed.popitem(last=False)
+        return query
+
+    @staticmethod
+    def cached_message(reference):
+        if isinstance(reference.resolved, discord.Message):
+            return reference.resolved
+        return discord.utils.get(bot.cached_messages, id=reference.message_id)
+
+    def peek(self, reference):
+        # Never hits the API; returns (found, query)
+        message_id = reference.message_id
+        if message_id in self.parsed:
+            self.hits += 1
+            self.parsed.move_to_end(message_id)
+            return True, self.parsed[message_id]
+        message = self.cached_message(reference)
+        if message is None:
+            return False, None
+        self.hits += 1
+        if message.embeds:
+            print("[DEBUG] FMbot Embed JSON:", message.embeds[0].to_dict())
+        return True, self._store(message_id, parse_fmbot_embed(message))
+
+    async def resolve(self, channel, reference):
+        found, query = self.peek(reference)
+        if found:
+            return query
+        self.fetches += 1
+        message = await channel.fetch_message(reference.message_id)
+        return self._store(reference.message_id, parse_fmbot_embed(message))
+
+
+reply_resolver = ReplyResolver()
 
 
 # Role to allowed commands mapping
@@ -138,7 +1510,7 @@ ROLE_PERMISSIONS = {
     "administrator": {
         "add", "remove", "quota", "limit", "status", "link", "leaderboard", "countdown",
         "user", "organizer", "administrator", "whoami", "lphelp",
-        "art", "artchannel", "refreshart", "reset", "playlist"
+        "art", "artchannel", "refreshart", "reset", "playlist", "stats", "memstats"
     },
     "organizer": {
         "add", "remove", "quota", "limit", "status", "link", "leaderboard", "countdown",
@@ -162,36 +1534,68 @@ def ensure_permissions_structure(gid):
                 permissions[gid][key] = []
 
 
+# === PERMISSION INDEX ===
+# gid -> {user_id: highest role}, built once from the permission lists and
+# updated on every grant, so role checks are a single dict lookup. The
+# lists in `permissions` (and the store) remain the persisted form.
+ROLE_RANK = {"user": 1, "organizer": 2, "administrator": 3}
+ROLE_BY_KEY = {"users": "user", "organizers": "organizer", "administrators": "administrator"}
+
+
+class PermissionIndex:
+    def __init__(self):
+        self.roles = {}
+
+    def build(self, permissions):
+        self.roles = {}
+        for gid, guild_perms in permissions.items():
+            for key, role in ROLE_BY_KEY.items():
+                for user_id in guild_perms.get(key, []):
+                    self.grant(gid, role, user_id)
+
+    def grant(self, gid, role, user_id):
+        guild_roles = self.roles.setdefault(str(gid), {})
+        current = guild_roles.get(str(user_id))
+        if current is None or ROLE_RANK[role] > ROLE_RANK[current]:
+            guild_roles[str(user_id)] = role
+
+    def role(self, gid, user_id):
+        return self.roles.get(str(gid), {}).get(str(user_id))
+
+
+permission_index = PermissionIndex()
+permission_index.build(permissions)
+
+
+def grant_permission(gid, key, user_id):
+    ensure_permissions_structure(gid)
+    if user_id not in permissions[gid][key]:
+        permissions[gid][key].append(user_id)
+        store.add_permission(gid, key, user_id)
+    permission_index.grant(gid, ROLE_BY_KEY[key], user_id)
+
+
 def get_user_role(guild_id, user_id):
-    user_id = str(user_id)
-    guild_id = str(guild_id)
-    guild_perms = permissions.get(guild_id, {})
-
-    if user_id in guild_perms.get("administrators", []):
-        return "administrator"
-    elif user_id in guild_perms.get("organizers", []):
-        return "organizer"
-    elif user_id in guild_perms.get("users", []):
-        return "user"
-    else:
-        return None
+    return permission_index.role(guild_id, user_id)
 
 def has_permission(command_name, user_role):
     allowed = ROLE_PERMISSIONS.get(user_role, set())
     return command_name in allowed or user_role == "administrator"
 
 def get_permission_level(guild_id, user_id):
-    guild_perms = permissions.get(str(guild_id), {})
-    user_id = str(user_id)
-
-    if user_id in guild_perms.get("administrators", []):
-        return "Administrator"
-    elif user_id in guild_perms.get("organizers", []):
-        return "Organizer"
-    elif user_id in guild_perms.get("users", []):
-        return "User"
-    else:
-        return "No permissions"
+    role = permission_index.role(guild_id, user_id)
+    return role.capitalize() if role else "No permissions"
+
+def is_user(gid, uid):
+    return permission_index.role(gid, uid) is not None
+
+def is_administrator(gid, uid):
+    return permission_index.role(gid, uid) == "administrator"
+
+def is_organizer(gid, uid):
+    # Organizer or higher
+    role = permission_index.role(gid, uid)
+    return role is not None and ROLE_RANK[role] >= ROLE_RANK["organizer"]
 
 # === AI PROMPT GENERATION ===
 # You can modify or add any to any of these to create your own flavor of AI art promtps. 
@@ -225,8 +1629,15 @@ def generate_prompt():
 
     return " ".join(parts)
 
-# === DALL-E GENERATION ===
-def generate_dalle_image(prompt):
+# === ART PIPELINE ===
+# generate (OpenAI) -> download once -> decode/resize/JPEG-encode in a
+# separate process (art_encode.py) -> the same JPEG bytes are saved locally,
+# posted to Discord and uploaded to Spotify. Nothing here blocks the event loop.
+ART_ENCODER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "art_encode.py")
+ART_ENCODE_TIMEOUT = float(os.getenv("ART_ENCODE_TIMEOUT", "60"))  # seconds
+
+
+async def generate_dalle_image(prompt):
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
@@ -237,49 +1648,422 @@ def generate_dalle_image(prompt):
         "n": 1,
         "size": "1024x1024"
     }
-    response = requests.post("https://api.openai.com/v1/images/generations", headers=headers, json=data)
-    response.raise_for_status()
-    image_url = response.json()["data"][0]["url"]
+    session = http_clients.get()
+    timeout = aiohttp.ClientTimeout(total=OPENAI_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    async with observe_external("openai", "images/generations"):
+        async with session.post("https://api.openai.com/v1/images/generations", headers=headers, json=data, timeout=timeout) as resp:
+            resp.raise_for_status()
+            payload = await resp.json()
+    image_url = payload["data"][0]["url"]
     return image_url
 
 
-def upload_playlist_cover(playlist_id, image_url):
+async def download_image(image_url):
+    print(f"[DEBUG] Downloading image from: {image_url}")
+    async with observe_external("cdn", "image"):
+        async with http_clients.get().get(image_url) as resp:
+            if resp.status != 200:
+                raise Exception(f"Failed to download image: {resp.status}")
+            return await resp.read()
+
+
+async def encode_cover(raw):
+    # A fresh interpreter per cover: unlike a multiprocessing pool it never
+    # re-imports this module or forks a process that is running threads
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, ART_ENCODER,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
     try:
-        session = Session()
-        session.mount("https://", TLSAdapter())
-
-        print(f"[DEBUG] Downloading image from: {image_url}")
-        response = session.get(image_url, verify=certifi.where())
-        response.raise_for_status()
-
-        # Convert to JPEG
-        img = Image.open(BytesIO(response.content)).convert("RGB")
-        buffer = BytesIO()
-        img.save(buffer, format="JPEG")
-        encoded_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
-
-        # Upload to Spotify
-        sp.playlist_upload_cover_image(playlist_id, encoded_image)
-        print("[INFO] Playlist cover updated successfully.")
-    except Exception as e:
-        print(f"[ERROR] Failed to upload playlist cover: {e}")
+        cover, error = await asyncio.wait_for(proc.communicate(raw), ART_ENCODE_TIMEOUT)
+    except BaseException:
+        # Timed out or cancelled (shutdown): don't leave the encoder running
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise ValueError(error.decode(errors="replace").strip() or f"Art encoder exited with {proc.returncode}")
+    return cover
+
+
+async def render_playlist_art(prompt):
+    image_url = await generate_dalle_image(prompt)
+    raw = await download_image(image_url)
+    return await encode_cover(raw)
+
+
+async def upload_playlist_cover(playlist_id, cover):
+    encoded_image = base64.b64encode(cover).decode("utf-8")
+    await spotify.playlist_upload_cover_image(playlist_id, encoded_image, priority=PRIORITY_BACKGROUND)
+    print("[INFO] Playlist cover updated successfully.")
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+# Clean up prompt to make it safe for filenames
+def sanitize_filename(text):
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', text)
+
+
+# === ART JOBS ===
+# Art generation takes tens of seconds, so commands only enqueue a job and
+# return. At most ART_CONCURRENCY jobs run at once, a second request for a
+# playlist that already has a job collapses into it, and pending jobs are
+# persisted to ART_JOBS_FILE so they are resumed after a restart.
+ART_JOBS_FILE = cluster_path("art_jobs.json")
+ART_CONCURRENCY = int(os.getenv("ART_CONCURRENCY", "2"))
+
+
+class ArtJobQueue:
+    def __init__(self, path=ART_JOBS_FILE, concurrency=ART_CONCURRENCY):
+        self.path = path
+        self.concurrency = concurrency
+        self.jobs = {}  # playlist_id: job
+        self.semaphore = None
+        self.tasks = set()
+        self.completed = 0
+        self.failed = 0
+        self.collapsed = 0
+        persistence.register(path, lambda: self.jobs)
+
+    def load(self):
+        for job in read_json_file(self.path).values():
+            job["status"] = "queued"  # anything that was running restarts from scratch
+            self.jobs[job["playlist_id"]] = job
+        if self.jobs:
+            print(f"[INFO] Loaded {len(self.jobs)} pending art job(s).")
+
+    def resume(self):
+        for job in self.jobs.values():
+            self._schedule(job)
+
+    def submit(self, playlist_id, guild_id, guild_name, channel_id, channel_name, prompt):
+        # Returns (job, created); created is False when collapsed into an existing job
+        job = self.jobs.get(playlist_id)
+        if job is not None:
+            self.collapsed += 1
+            if channel_id not in job["notify_channel_ids"]:
+                job["notify_channel_ids"].append(channel_id)
+                persistence.mark_dirty(self.path)
+            return job, False
+
+        job = {
+            "playlist_id": playlist_id,
+            "guild_id": guild_id,
+            "guild_name": guild_name,
+            "channel_name": channel_name,
+            "notify_channel_ids": [channel_id],
+            "prompt": prompt,
+            "status": "queued",
+            "requested_at": datetime.now().isoformat(),
+        }
+        self.jobs[playlist_id] = job
+        persistence.mark_dirty(self.path)
+        self._schedule(job)
+        return job, True
+
+    def _schedule(self, job):
+        task = asyncio.create_task(self._run(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, job):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        await bot.wait_until_ready()
+
+        async with self.semaphore:
+            job["status"] = "running"
+            persistence.mark_dirty(self.path)
+            try:
+                cover = await run_art_job(job)
+            except asyncio.CancelledError:
+                # Shutting down: the job stays in self.jobs (and on disk) and is resumed next start
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"[ERROR] Failed to refresh playlist art: {e}")
+                cover = None
+            else:
+                self.completed += 1
+
+            self.jobs.pop(job["playlist_id"], None)
+            persistence.mark_dirty(self.path)
+            await report_art_job(job, cover)
+
+    def stats(self):
+        running = sum(1 for job in self.jobs.values() if job["status"] == "running")
+        return {
+            "queued": len(self.jobs) - running,
+            "running": running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "collapsed": self.collapsed,
+        }
+
+    def shutdown(self):
+        # Jobs stay in self.jobs (and on disk) so they are resumed next start
+        for task in self.tasks:
+            task.cancel()
+
 
-def get_all_playlist_tracks(sp, playlist_id):
+async def run_art_job(job):
+    prompt = job["prompt"]
+    print(f"[DEBUG] Using prompt: {prompt}")
+
+    cover = await render_playlist_art(prompt)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+    safe_prompt = sanitize_filename(prompt)
+
+    # Get human-readable folder names
+    folder_name = f"{sanitize_filename(job['guild_name'])}_{sanitize_filename(job['channel_name'])}"
+    local_dir = os.path.join("playlist_art", folder_name)
+    os.makedirs(local_dir, exist_ok=True)
+
+    local_filename = os.path.join(local_dir, f"{safe_prompt}_{timestamp}.jpg")
+
+    # Save the same encoded bytes we upload everywhere else
+    await asyncio.get_running_loop().run_in_executor(None, write_file, local_filename, cover)
+    print(f"[INFO] Image saved to {local_filename}")
+
+    await upload_playlist_cover(job["playlist_id"], cover)
+    print(f"[DEBUG] Uploaded playlist cover for: {job['playlist_id']}")
+    return cover
+
+
+async def report_art_job(job, cover):
+    prompt = job["prompt"]
+    for channel_id in job["notify_channel_ids"]:
+        channel = bot.get_channel(int(channel_id))
+        if channel is None:
+            continue
+        try:
+            if cover is not None:
+                await channel.send(f"🎨 Playlist art refreshed with prompt: `{prompt}`") # type: ignore
+            else:
+                await channel.send("⚠️ Failed to refresh playlist art.") # type: ignore
+        except Exception as e:
+            print(f"[ERROR] Failed to report art job: {e}")
+
+    if cover is None:
+        return
+
+    # Send image to art channel if it's configured
+    art_channel_id = permissions.get(job["guild_id"], {}).get("art_channel")
+    if art_channel_id:
+        art_channel = bot.get_channel(int(art_channel_id))
+        if art_channel:
+            # Reupload to Discord for embedding
+            file = discord.File(BytesIO(cover), filename="playlist_art.jpg")
+            embed = discord.Embed(title="🖼️ New Playlist Art", description=f"Prompt: `{prompt}`")
+            embed.set_image(url="attachment://playlist_art.jpg")
+            try:
+                await art_channel.send(file=file, embed=embed) # type: ignore
+            except Exception as e:
+                print(f"[ERROR] Failed to post to art channel: {e}")
+        else:
+            print(f"[WARN] Art channel not found: {art_channel_id}")
+
+
+art_jobs = ArtJobQueue()
+art_jobs.load()
+
+
+async def get_all_playlist_tracks(playlist_id, priority=PRIORITY_STATUS):
     all_tracks = []
     offset = 0
     limit = 100
 
     while True:
-        response = sp.playlist_items(playlist_id, offset=offset, limit=limit)
+        response = await spotify.playlist_items(playlist_id, offset=offset, limit=limit, priority=priority)
         items = response.get("items", [])
-        if not items:
-            break
         all_tracks.extend(items)
         offset += len(items)
+        if not items or not response.get("next"):
+            break
 
     return all_tracks
 
 
+# === BATCHED PLAYLIST ADDS ===
+# During a rush many !add calls hit the same playlist within seconds. Adds are
+# queued per playlist for ADD_BATCH_WINDOW seconds and sent as one
+# playlist_add_items call (up to 100 tracks, Spotify's limit). Each caller
+# awaits its own future, so it still gets its own confirmation or error.
+ADD_BATCH_WINDOW = float(os.getenv("ADD_BATCH_WINDOW", "0.5"))  # seconds
+ADD_BATCH_MAX = 100
+
+
+class PlaylistAddBatcher:
+    def __init__(self, window=ADD_BATCH_WINDOW):
+        self.window = window
+        self.pending = {}  # playlist_id: [(track_id, future)]
+        self.timers = {}  # playlist_id: flush task
+        self.locks = {}  # playlist_id: asyncio.Lock, keeps batches in submission order
+        self.lock_users = {}  # playlist_id: flushes holding or waiting on the lock
+        self.tasks = set()  # running flushes, so they aren't garbage collected mid-flight
+        self.batches = 0
+        self.tracks = 0
+
+    async def add(self, playlist_id, track_id):
+        future = asyncio.get_running_loop().create_future()
+        queue = self.pending.setdefault(playlist_id, [])
+        queue.append((track_id, future))
+
+        if len(queue) == ADD_BATCH_MAX:
+            self._spawn(self._flush(playlist_id))
+        elif playlist_id not in self.timers:
+            self.timers[playlist_id] = self._spawn(self._flush_later(playlist_id))
+        return await future
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[ERROR] Batched add flush failed: {task.exception()}")
+
+    async def _flush_later(self, playlist_id):
+        await asyncio.sleep(self.window)
+        self.timers.pop(playlist_id, None)
+        await self._flush(playlist_id)
+
+    async def _flush(self, playlist_id):
+        queue = self.pending.get(playlist_id)
+        if not queue:
+            return
+        # Never send more than Spotify accepts; whatever is left goes out in the next batch
+        batch = queue[:ADD_BATCH_MAX]
+        del queue[:ADD_BATCH_MAX]
+        if not queue:
+            del self.pending[playlist_id]
+        elif len(queue) >= ADD_BATCH_MAX:
+            self._spawn(self._flush(playlist_id))
+        elif playlist_id not in self.timers:
+            self.timers[playlist_id] = self._spawn(self._flush_later(playlist_id))
+
+        lock = self.locks.setdefault(playlist_id, asyncio.Lock())
+        self.lock_users[playlist_id] = self.lock_users.get(playlist_id, 0) + 1
+        try:
+            async with lock:
+                try:
+                    await spotify.playlist_add_items(playlist_id, [track_id for track_id, _ in batch])
+                    self.batches += 1
+                    self.tracks += len(batch)
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_result(True)
+                except Exception as e:
+                    print(f"[ERROR] Batched add of {len(batch)} track(s) to {playlist_id} failed: {e}")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+        finally:
+            # Only drop the lock once no other flush is holding or waiting on it
+            self.lock_users[playlist_id] -= 1
+            if not self.lock_users[playlist_id]:
+                del self.lock_users[playlist_id]
+                self.locks.pop(playlist_id, None)
+
+
+playlist_adds = PlaylistAddBatcher()
+
+
+# === PLAYLIST MIRROR ===
+# Local copy of each playlist's tracks stamped with Spotify's snapshot_id.
+# Read paths use the mirror as-is; our own adds/removes are applied locally
+# and the background reconciler re-checks snapshot_id to pick up edits made
+# outside the bot (or to confirm ours), refetching only when it changed.
+MIRROR_SYNC_MINUTES = float(os.getenv("MIRROR_SYNC_MINUTES", "5"))
+
+
+class PlaylistMirror:
+    def __init__(self):
+        self.playlists = {}  # playlist_id: {"snapshot_id": str, "items": [{"track": {...}}]}
+        self.locks = {}
+        self.snapshot_checks = 0
+        self.refetches = 0
+
+    @staticmethod
+    def _slim_items(items):
+        # Skip local files / removed tracks, which come back without an ID
+        return [{"track": slim_track(item["track"])} for item in items
+                if item.get("track") and item["track"].get("id")]
+
+    async def get_items(self, playlist_id, priority=PRIORITY_STATUS):
+        entry = self.playlists.get(playlist_id)
+        if entry is not None:
+            return entry["items"]
+        return await self.refresh(playlist_id, priority)
+
+    async def refresh(self, playlist_id, priority=PRIORITY_STATUS):
+        lock = self.locks.setdefault(playlist_id, asyncio.Lock())
+        async with lock:
+            self.snapshot_checks += 1
+            snapshot_id = (await spotify.playlist(playlist_id, fields="snapshot_id", priority=priority))["snapshot_id"]
+            entry = self.playlists.get(playlist_id)
+            if entry is not None and entry["snapshot_id"] == snapshot_id:
+                return entry["items"]
+
+            self.refetches += 1
+            items = self._slim_items(await get_all_playlist_tracks(playlist_id, priority))
+            self.playlists[playlist_id] = {"snapshot_id": snapshot_id, "items": items}
+            return items
+
+    def set_empty(self, playlist_id, snapshot_id):
+        self.playlists[playlist_id] = {"snapshot_id": snapshot_id, "items": []}
+
+    # Local edits keep the old snapshot_id on purpose so the reconciler
+    # still notices the playlist changed and verifies it against Spotify.
+    def add_local(self, playlist_id, track):
+        entry = self.playlists.get(playlist_id)
+        if entry is not None:
+            entry["items"].append({"track": slim_track(track)})
+
+    def remove_local(self, playlist_id, track_ids):
+        entry = self.playlists.get(playlist_id)
+        if entry is not None:
+            track_ids = set(track_ids)
+            entry["items"] = [item for item in entry["items"] if item["track"]["id"] not in track_ids]
+
+    def stats(self):
+        return {
+            "playlists": len(self.playlists),
+            "tracks": sum(len(entry["items"]) for entry in self.playlists.values()),
+            "snapshot_checks": self.snapshot_checks,
+            "refetches": self.refetches,
+        }
+
+
+playlist_mirror = PlaylistMirror()
+
+
+@tasks.loop(minutes=MIRROR_SYNC_MINUTES)
+async def sync_playlist_mirrors():
+    mapped = set(playlist_map.values())
+    for playlist_id in list(playlist_mirror.playlists):
+        if playlist_id not in mapped:
+            playlist_mirror.playlists.pop(playlist_id, None)
+            continue
+        try:
+            await playlist_mirror.refresh(playlist_id, PRIORITY_BACKGROUND)
+        except Exception as e:
+            print(f"[ERROR] Failed to sync playlist {playlist_id}: {e}")
+
+
+@sync_playlist_mirrors.before_loop
+async def before_sync_playlist_mirrors():
+    await bot.wait_until_ready()
+
+
 @bot.event
 async def on_message(message):
     if message.author.bot:
@@ -287,77 +2071,88 @@ async def on_message(message):
 
     # Poll reply logic
     if message.reference and message.reference.message_id:
-        for poll_key, poll in active_polls.items():
-            if poll["status"] == "collecting" and message.reference.message_id == poll["message_id"]:
-                user_id = str(message.author.id)
+        poll_key = poll_by_submission_message.get(message.reference.message_id)
+        poll = active_polls.get(poll_key)
 
-                # Make sure this is a reply to THIS poll only
-                if str(message.channel.id) != poll["channel_id"]:
-                    continue
+        # Make sure this is a reply to THIS poll only
+        if poll and poll["status"] == "collecting" and str(message.channel.id) == poll["channel_id"]:
+            user_id = str(message.author.id)
 
-                # Initialize user's submission list
-                if user_id not in poll["submissions"]:
-                    poll["submissions"][user_id] = []
+            # Initialize user's submission list
+            if user_id not in poll["submissions"]:
+                poll["submissions"][user_id] = []
 
-                if len(poll["submissions"][user_id]) >= poll["submission_limit"]:
-                    await message.channel.send("⚠️ You've reached your submission limit for this poll.", delete_after=5)
-                else:
-                    poll["submissions"][user_id].append(message.content)
-                    print(f"[POLL] {message.author} submitted to '{poll_key}': {message.content}")
-                break  # stop once matched correctly
+            if len(poll["submissions"][user_id]) >= poll["submission_limit"]:
+                await message.channel.send("⚠️ You've reached your submission limit for this poll.", delete_after=5)
+            else:
+                poll["submissions"][user_id].append(message.content)
+                save_polls()
+                print(f"[POLL] {message.author} submitted to '{poll_key}': {message.content}")
 
-        # Debug embed structure if replying to an fmbot message
-        try:
-            replied_msg = await message.channel.fetch_message(message.reference.message_id)
-            if replied_msg.embeds:
-                embed = replied_msg.embeds[0]
-                print("[DEBUG] FMbot Embed JSON:", embed.to_dict())
-        except Exception as e:
-            print(f"[ERROR] Failed to fetch replied message or embed: {e}")
+        # Parse fmbot embeds we already have so a following !add doesn't need a fetch
+        reply_resolver.peek(message.reference)
 
     await bot.process_commands(message)
 
+# Votes are tallied live from raw reaction events (they fire even for vote
+# messages that aren't in the message cache, e.g. after a restart).
 @bot.event
-async def on_reaction_add(reaction, user):
-    if user.bot: return
+async def on_raw_reaction_add(payload):
+    if payload.user_id == bot.user.id or (payload.member is not None and payload.member.bot): # type: ignore
+        return
 
-    msg_id = reaction.message.id
-    poll = next((p for p in active_polls.values() if p.get("vote_message_id") == msg_id and p["status"] == "voting"), None)
-    if not poll or poll.get("vote_limit") is None:
+    poll_key = poll_by_vote_message.get(payload.message_id)
+    poll = active_polls.get(poll_key)
+    if not poll or poll["status"] != "voting" or poll["tallies"] is None:
         return
 
-    # Create/init lock
-    if msg_id not in locks:
-        locks[msg_id] = asyncio.Lock()
+    entry = vote_entry_index(poll, payload.message_id, str(payload.emoji))
+    if entry is None:
+        return
 
-    async with locks[msg_id]:
-        votes = user_votes.setdefault(msg_id, {}).setdefault(user.id, [])
-        if poll["vote_limit"] == 1:
-            # Remove all previous votes atomically
-            for e in votes:
-                try:
-                    await reaction.message.remove_reaction(e, user)
-                except:
-                    pass
+    user_id = str(payload.user_id)
+    # Only the tallies change under the lock; the Discord calls to take
+    # reactions back happen after it is released so other votes aren't held up
+    unwanted = []
+    async with poll_locks.setdefault(poll_key, asyncio.Lock()):
+        votes = poll["votes"].setdefault(user_id, [])
+        vote_limit = poll.get("vote_limit")
+        if entry in votes:
+            return
+        if vote_limit == 1:
+            # Swap the previous vote for this one
+            for previous in votes:
+                poll["tallies"][previous] -= 1
+            unwanted = list(votes)
             votes.clear()
-            votes.append(reaction.emoji)
-        else:
-            if reaction.emoji in votes:
-                return
-            if len(votes) >= poll["vote_limit"]:
-                try:
-                    await reaction.message.remove_reaction(reaction.emoji, user)
-                except:
-                    pass
-            else:
-                votes.append(reaction.emoji)
+        elif vote_limit is not None and len(votes) >= vote_limit:
+            unwanted = [entry]
+        if entry not in unwanted:
+            votes.append(entry)
+            poll["tallies"][entry] += 1
+            save_polls()
+
+    for removed in unwanted:
+        await remove_vote_reaction(poll, removed, user_id)
 
 @bot.event
-async def on_reaction_remove(reaction, user):
-    message_id = reaction.message.id
-    if message_id in user_votes and user.id in user_votes[message_id]:
-        if reaction.emoji in user_votes[message_id][user.id]:
-            user_votes[message_id][user.id].remove(reaction.emoji)
+async def on_raw_reaction_remove(payload):
+    poll_key = poll_by_vote_message.get(payload.message_id)
+    poll = active_polls.get(poll_key)
+    if not poll or poll["status"] != "voting" or poll["tallies"] is None:
+        return
+
+    entry = vote_entry_index(poll, payload.message_id, str(payload.emoji))
+    if entry is None:
+        return
+
+    async with poll_locks.setdefault(poll_key, asyncio.Lock()):
+        # Reactions we removed ourselves (vote limit) were never counted
+        votes = poll["votes"].get(str(payload.user_id), [])
+        if entry in votes:
+            votes.remove(entry)
+            poll["tallies"][entry] -= 1
+            save_polls()
 
 
 @bot.command(name="add", aliases=["a"])
@@ -375,37 +2170,19 @@ async def add_to_playlist(ctx, *, song_query: str = None): # type: ignore
             await ctx.send("No playlist linked to this channel.")
             return
 
-        # === Ensure structure exists ===
-        if gid not in user_submissions:
-            user_submissions[gid] = {}
-        if playlist_id not in user_submissions[gid]:
-            user_submissions[gid][playlist_id] = {}
-        if user_id not in user_submissions[gid][playlist_id]:
-            user_submissions[gid][playlist_id][user_id] = []
-
         # === Quota lookup ===
         user_quota = submission_quotas.get(gid, {}).get(cid, 2)
-        user_tracks = user_submissions[gid][playlist_id][user_id]
 
-        if len(user_tracks) >= user_quota:
+        if submission_index.count(gid, playlist_id, user_id) >= user_quota:
             await ctx.send(f"{ctx.author.mention}, you've hit your submission limit of {user_quota}.")
             return
 
         # === Try FMbot reply parsing first ===
         if not song_query and ctx.message.reference:
             try:
-                replied_msg = await ctx.channel.fetch_message(ctx.message.reference.message_id)
-                if replied_msg.embeds:
-                    embed = replied_msg.embeds[0]
-                    desc = embed.description or ""
-
-                    track_match = re.search(r"\[([^\]]+)\]\(", desc)
-                    artist_match = re.search(r"\*\*(.*?)\*\*", desc)
-                    if track_match and artist_match:
-                        title = track_match.group(1).strip()
-                        artist = artist_match.group(1).strip()
-                        song_query = f"{title} - {artist}"
-                        print(f"[DEBUG] Pulled from fmbot reply: {song_query}")
+                song_query = await reply_resolver.resolve(ctx.channel, ctx.message.reference)
+                if song_query:
+                    print(f"[DEBUG] Pulled from fmbot reply: {song_query}")
             except Exception as e:
                 print(f"[ERROR] Failed to parse fmbot reply: {e}")
 
@@ -424,7 +2201,12 @@ async def add_to_playlist(ctx, *, song_query: str = None): # type: ignore
         # === Track Lookup ===
         if "open.spotify.com/track" in song_query:
             track_id = song_query.split("track/")[-1].split("?")[0]
-            track = sp.track(track_id)
+            if submission_index.owner(gid, playlist_id, track_id) is not None:
+                await ctx.send("This track has already been submitted.")
+                return
+            track = track_cache.get_track(track_id)
+            if track is None:
+                track = track_cache.put_track(await spotify.track(track_id))
         else:
             parts = [part.strip() for part in song_query.split('-')]
             if len(parts) < 2:
@@ -434,13 +2216,16 @@ async def add_to_playlist(ctx, *, song_query: str = None): # type: ignore
             song, artist = parts[0], parts[1]
             album = parts[2] if len(parts) > 2 else None
             q = f"track:{song} artist:{artist}" + (f" album:{album}" if album else "")
-            results = sp.search(q=q, type='track', limit=1)
+            track = track_cache.get_query(q)
 
-            if not results['tracks']['items']: # type: ignore
-                await ctx.send(f"Couldn't find: {song} by {artist}" + (f" on album {album}" if album else ""))
-                return
+            if track is None:
+                results = await spotify.search(q=q, type='track', limit=1)
 
-            track = results['tracks']['items'][0] # type: ignore
+                if not results['tracks']['items']: # type: ignore
+                    await ctx.send(f"Couldn't find: {song} by {artist}" + (f" on album {album}" if album else ""))
+                    return
+
+                track = track_cache.put_track(results['tracks']['items'][0], query=q) # type: ignore
             track_id = track['id']
 
         # === Duration Limit ===
@@ -454,17 +2239,24 @@ async def add_to_playlist(ctx, *, song_query: str = None): # type: ignore
             return
 
         # === Check for duplicates ===
-        all_submitted = [tid for u in user_submissions[gid][playlist_id].values() for tid in u]
-        if track_id in all_submitted:
+        if submission_index.owner(gid, playlist_id, track_id) is not None:
             await ctx.send("This track has already been submitted.")
             return
 
-        # === Add and persist ===
-        sp.playlist_add_items(playlist_id, [track_id])
-        user_tracks.append(track_id)
+        # Another !add from this user may have landed while we were looking the track up
+        if submission_index.count(gid, playlist_id, user_id) >= user_quota:
+            await ctx.send(f"{ctx.author.mention}, you've hit your submission limit of {user_quota}.")
+            return
 
-        with open(SUBMISSIONS_FILE, "w") as f:
-            json.dump(user_submissions, f)
+        # === Add and persist ===
+        # Reserve the submission first so concurrent adds see it while the batch is pending
+        record_submission(gid, playlist_id, user_id, track_id)
+        try:
+            await playlist_adds.add(playlist_id, track_id)
+        except Exception:
+            drop_submission(gid, playlist_id, user_id, track_id)
+            raise
+        playlist_mirror.add_local(playlist_id, track)
 
         embed = discord.Embed(
             title=track['name'], # type: ignore
@@ -475,6 +2267,7 @@ async def add_to_playlist(ctx, *, song_query: str = None): # type: ignore
         await ctx.send("✅ Track added:", embed=embed)
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] {e}")
         await ctx.send(f"Error: {str(e)}")
 
@@ -491,6 +2284,7 @@ async def playlist_link(ctx):
         await ctx.send(f"Here's the playlist for this channel: {playlist_url}")
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] {e}")
         await ctx.send(f"Error: {str(e)}")
 
@@ -502,13 +2296,13 @@ async def create_playlist(ctx, action: str, *, args: str):
             return
 
         playlist_name, channel_name = args.split(" to ", 1)
-        user_id = sp.current_user()["id"] # type: ignore
-        new_playlist = sp.user_playlist_create(user_id, playlist_name, public=True)
+        user_id = (await spotify.current_user())["id"] # type: ignore
+        new_playlist = await spotify.user_playlist_create(user_id, playlist_name, public=True)
         playlist_id = new_playlist['id'] # type: ignore
+        playlist_mirror.set_empty(playlist_id, new_playlist['snapshot_id']) # type: ignore
 
         playlist_map[channel_name] = playlist_id
-        with open(PLAYLIST_MAP_FILE, "w") as f:
-            json.dump(playlist_map, f)
+        store.set_playlist(channel_name, playlist_id)
 
         await ctx.send(f"Playlist '{playlist_name}' linked to channel '{channel_name}'!")
 
@@ -517,14 +2311,11 @@ async def create_playlist(ctx, action: str, *, args: str):
         cid = str(ctx.channel.id)
         if art_settings.get(gid, {}).get(cid, False):
             prompt = generate_prompt()
-            try:
-                image_url = generate_dalle_image(prompt)
-                upload_playlist_cover(playlist_id, image_url)
-                await ctx.send(f"🖼️ AI-generated cover added using prompt: `{prompt}`")
-            except Exception as art_error:
-                await ctx.send(f"⚠️ Failed to generate cover art: {art_error}")
+            art_jobs.submit(playlist_id, gid, ctx.guild.name, cid, ctx.channel.name, prompt)
+            await ctx.send(f"🖼️ Generating an AI cover in the background using prompt: `{prompt}`")
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] {e}")
         await ctx.send(f"Error: {str(e)}")
 
@@ -550,8 +2341,7 @@ async def toggle_art(ctx, setting: str):
         await ctx.send("Usage: `!art on` or `!art off`")
         return
 
-    with open(ART_SETTING_FILE, "w") as f:
-        json.dump(art_settings, f)
+    store.set_art(gid, cid, art_settings[gid][cid])
 
 
 @bot.command(name="refreshart", aliases=["ra"])
@@ -572,66 +2362,12 @@ async def refresh_art(ctx, *, custom_prompt: str = None): # type: ignore
         await ctx.send("⚠️ No playlist is linked to this channel.")
         return
 
-    try:
-        prompt = custom_prompt if custom_prompt else generate_prompt()
-        print(f"[DEBUG] Using prompt: {prompt}")
-
-        image_url = generate_dalle_image(prompt)
-        print(f"[DEBUG] Downloaded image from: {image_url}")
-            
-        # Clean up prompt to make it safe for filenames
-        def sanitize_filename(text):
-            return re.sub(r'[^a-zA-Z0-9_-]', '_', text)
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        safe_prompt = sanitize_filename(prompt)
-
-        # Get human-readable folder names
-        guild_name = sanitize_filename(ctx.guild.name)
-        channel_name = sanitize_filename(ctx.channel.name)
-
-        folder_name = f"{guild_name}_{channel_name}"
-        local_dir = os.path.join("playlist_art", folder_name)
-        os.makedirs(local_dir, exist_ok=True)
-
-        local_filename = os.path.join(local_dir, f"{safe_prompt}_{timestamp}.png")
-
-        # Download the image
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url) as resp:
-                if resp.status == 200:
-                    with open(local_filename, 'wb') as f:
-                        f.write(await resp.read())
-                    print(f"[INFO] Image saved to {local_filename}")
-                else:
-                    raise Exception(f"Failed to download image: {resp.status}")
-
-
-        # Reupload to Discord for embedding
-        file = discord.File(local_filename, filename="playlist_art.png")
-        embed = discord.Embed(title="🖼️ New Playlist Art", description=f"Prompt: `{prompt}`")
-        embed.set_image(url="attachment://playlist_art.png")
-
-        upload_playlist_cover(playlist_id, image_url)
-        print(f"[INFO] Playlist cover updated successfully.")
-        print(f"[DEBUG] Uploaded playlist cover for: {playlist_id}")
-
-        await ctx.send(f"🎨 Playlist art refreshed with prompt: `{prompt}`")
-
-        # Send image to art channel if it's configured
-        art_channel_id = permissions.get(gid, {}).get("art_channel")
-        if art_channel_id:
-            art_channel = bot.get_channel(int(art_channel_id))
-            if art_channel:
-                embed = discord.Embed(title="🖼️ New Playlist Art", description=f"Prompt: `{prompt}`")
-                # embed.set_image(url=image_url)
-                await art_channel.send(file=file, embed=embed) # type: ignore
-            else:
-                print(f"[WARN] Art channel not found: {art_channel_id}")
-
-    except Exception as e:
-        print(f"[ERROR] Failed to refresh playlist art: {e}")
-        await ctx.send("⚠️ Failed to refresh playlist art.")
+    prompt = custom_prompt if custom_prompt else generate_prompt()
+    job, created = art_jobs.submit(playlist_id, gid, ctx.guild.name, cid, ctx.channel.name, prompt)
+    if created:
+        await ctx.send(f"🎨 Generating new playlist art with prompt: `{prompt}` — I'll post here when it's done.")
+    else:
+        await ctx.send(f"⏳ Art for this playlist is already being generated (prompt: `{job['prompt']}`). I'll post here when it's done.")
 
 @bot.command(name="prompt")
 async def generate_ai_prompt(ctx):
@@ -639,6 +2375,7 @@ async def generate_ai_prompt(ctx):
         prompt = generate_prompt()
         await ctx.send(f"🎨 Generated AI prompt: `{prompt}`")
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] Failed to generate prompt: {e}")
         await ctx.send("⚠️ Failed to generate AI prompt.")
 
@@ -662,69 +2399,135 @@ async def set_art_channel(ctx, *, channel_name: str):
 
     permissions[gid]["art_channel"] = str(art_channel.id)
 
-    # Backup existing file (optional but clutch while testing)
     try:
-        import shutil
-        shutil.copy(PERMISSIONS_FILE, PERMISSIONS_FILE + ".bak")
+        store.set_guild_setting(gid, "art_channel", str(art_channel.id))
+        print("[DEBUG] Art channel saved successfully.")
     except Exception as e:
-        print(f"[WARN] Couldn't backup permissions file: {e}")
+        ctx.command_failed = True
+        print(f"[ERROR] Failed to save art channel: {e}")
 
-    # Safe save
-    try:
+    await ctx.send(f"✅ Playlist art will now be posted in #{art_channel.name}")
 
-        import traceback
 
-        print(f"[DEBUG] Writing to {PERMISSIONS_FILE} from {ctx.command.name if 'ctx' in locals() else 'unknown'}")
-        traceback.print_stack()
+# === STATUS PAGES ===
+# !status shows the playlist a page at a time in an embed with Prev/Next
+# buttons. Each page is built only when it is viewed: sliced from the mirror
+# when the playlist is mirrored, otherwise fetched from Spotify with offset
+# paging, and only that page's submitters are resolved.
+STATUS_PAGE_SIZE = 20
+STATUS_LINE_MAX = 180  # 20 lines stay well under the 4096-character embed description limit
+STATUS_VIEW_TIMEOUT = 180  # seconds the buttons stay active
+
+
+async def fetch_status_page(playlist_id, page):
+    start = page * STATUS_PAGE_SIZE
+    entry = playlist_mirror.playlists.get(playlist_id)
+    if entry is not None:
+        return entry["items"][start:start + STATUS_PAGE_SIZE], len(entry["items"])
+    response = await spotify.playlist_items(playlist_id, offset=start, limit=STATUS_PAGE_SIZE, priority=PRIORITY_STATUS)
+    return PlaylistMirror._slim_items(response.get("items", [])), response.get("total", 0)
+
+
+async def render_status_page(guild, playlist_id, page):
+    gid = str(guild.id)
+    items, total = await fetch_status_page(playlist_id, page)
+    pages = max(1, -(-total // STATUS_PAGE_SIZE))
+
+    # Find who submitted each track on this page, then resolve their names in one go
+    owners = [submission_index.owner(gid, playlist_id, item["track"]["id"]) for item in items]
+    names = await member_names.resolve(guild, [u for u in owners if u is not None])
+
+    lines = []
+    for number, (item, user_id) in enumerate(zip(items, owners), page * STATUS_PAGE_SIZE + 1):
+        track = item["track"]
+        user_name = names[user_id] if user_id is not None else "Unknown"
+        line = f"{number}. {track['name']} by {track['artists'][0]['name']} — submitted by {user_name}"
+        lines.append(line[:STATUS_LINE_MAX])
+
+    embed = discord.Embed(title="📄 Playlist Submissions", description="\n".join(lines) or "📭 No tracks on this page.")
+    embed.set_footer(text=f"Page {page + 1}/{pages} · {total} track{'s' if total != 1 else ''}")
+    return embed, total, pages
+
+
+class StatusView(discord.ui.View):
+    def __init__(self, guild, playlist_id, author_id, page, pages):
+        super().__init__(timeout=STATUS_VIEW_TIMEOUT)
+        self.guild = guild
+        self.playlist_id = playlist_id
+        self.author_id = author_id
+        self.page = page
+        self.pages = pages
+        self.message = None
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Run `!status` yourself to page through the playlist.", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction, page):
+        # Acknowledge within Discord's 3s window; the page may need a Spotify call and member lookups
+        await interaction.response.defer()
+        try:
+            embed, _, self.pages = await render_status_page(self.guild, self.playlist_id, page)
+            self.page = min(page, self.pages - 1)
+            self._update_buttons()
+            await interaction.edit_original_response(embed=embed, view=self)
+        except Exception as e:
+            print(f"[ERROR] Failed to show status page: {e}")
+            await interaction.followup.send(f"Error: {str(e)}", ephemeral=True)
 
-        with open(PERMISSIONS_FILE, "w") as f:
-            json.dump(permissions, f, indent=4)
-        print("[DEBUG] Permissions saved successfully.")
-    except Exception as e:
-        print(f"[ERROR] Failed to save permissions: {e}")
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self._show(interaction, self.page - 1)
 
-    await ctx.send(f"✅ Playlist art will now be posted in #{art_channel.name}")
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        if self.message is None:
+            return
+        for child in self.children:
+            child.disabled = True
+        try:
+            await self.message.edit(view=self)
+        except discord.HTTPException:
+            pass
 
 
 @bot.command(name="status", aliases=["s"])
-async def status(ctx):
+async def status(ctx, page: int = 1):
     try:
-        gid = str(ctx.guild.id)
-        channel_name = ctx.channel.name
         playlist_id = playlist_map.get(str(ctx.channel.id))
 
-
         if not playlist_id:
             await ctx.send("No playlist linked to this channel.")
             return
 
-        playlist_items = sp.playlist_items(playlist_id, limit=100)["items"]  # type: ignore
-        submission_data = user_submissions.get(gid, {}).get(playlist_id, {})
-
-        status_lines = []
-        for item in playlist_items:
-            track = item["track"]
-            track_id = track["id"]
-            user_name = "Unknown"
-
-            # Find who submitted the track
-            for user_id, tracks in submission_data.items():
-                if track_id in tracks:
-                    try:
-                        member = await ctx.guild.fetch_member(int(user_id))
-                        user_name = member.display_name
-                    except:
-                        user_name = f"👻 Unknown User"
-                    break
-
-            status_lines.append(f"{track['name']} by {track['artists'][0]['name']} — submitted by {user_name}")
-
-        if status_lines:
-            await ctx.send("**📄 Playlist Submissions:**\n" + "\n".join(status_lines))
-        else:
+        page = max(0, page - 1)
+        embed, total, pages = await render_status_page(ctx.guild, playlist_id, page)
+        if total == 0:
             await ctx.send("📭 No tracks found in the playlist.")
+            return
+        if page >= pages:
+            page = pages - 1
+            embed, total, pages = await render_status_page(ctx.guild, playlist_id, page)
+
+        if pages == 1:
+            await ctx.send(embed=embed)
+            return
+
+        view = StatusView(ctx.guild, playlist_id, ctx.author.id, page, pages)
+        view.message = await ctx.send(embed=embed, view=view)
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] {e}")
         await ctx.send(f"Error: {str(e)}")
 
@@ -752,9 +2555,7 @@ async def set_quota(ctx, quota: int = None): # type: ignore
     if gid not in submission_quotas:
         submission_quotas[gid] = {}
     submission_quotas[gid][cid] = quota
-
-    with open(QUOTA_FILE, "w") as f:
-        json.dump(submission_quotas, f)
+    store.set_quota(gid, cid, quota)
 
     await ctx.send(f"✅ Quota set to `{quota}` track(s) per user for this playlist.")
 
@@ -781,9 +2582,7 @@ async def set_limit(ctx, minutes: int = None): # type: ignore
     if gid not in duration_limits:
         duration_limits[gid] = {}
     duration_limits[gid][cid] = minutes
-
-    with open(LIMIT_FILE, "w") as f:
-        json.dump(duration_limits, f)
+    store.set_limit(gid, cid, minutes)
 
     await ctx.send(f"✅ Track duration limit set to `{minutes}` minutes.")
 
@@ -799,16 +2598,11 @@ async def reset_playlist(ctx):
             await ctx.send("No playlist linked to this channel.")
             return
 
-        # Fetch all tracks from the playlist
-        tracks = []
-        results = sp.playlist_items(playlist_id, limit=100)
-        tracks.extend(results["items"]) # type: ignore
-        while results["next"]: # type: ignore
-            results = sp.next(results)
-            tracks.extend(results["items"]) # type: ignore
+        # Make sure we're working from the current playlist, not a stale mirror
+        tracks = await playlist_mirror.refresh(playlist_id)
 
         # Collect all track IDs
-        track_ids = [item["track"]["id"] for item in tracks if item["track"]]
+        track_ids = [item["track"]["id"] for item in tracks]
 
         if not track_ids:
             await ctx.send("Playlist is already empty.")
@@ -817,20 +2611,16 @@ async def reset_playlist(ctx):
         # Remove all tracks in chunks of 100 (API limit)
         for i in range(0, len(track_ids), 100):
             chunk = track_ids[i:i+100]
-            sp.playlist_remove_all_occurrences_of_items(playlist_id, chunk)
+            await spotify.playlist_remove_all_occurrences_of_items(playlist_id, chunk)
+        playlist_mirror.remove_local(playlist_id, track_ids)
 
         # Clear submissions in our structure
-        if gid in user_submissions and playlist_id in user_submissions[gid]:
-            del user_submissions[gid][playlist_id]
-            if not user_submissions[gid]:  # cleanup if empty
-                del user_submissions[gid]
-
-        with open(SUBMISSIONS_FILE, "w") as f:
-            json.dump(user_submissions, f, indent=2)
+        clear_submissions(gid, playlist_id)
 
         await ctx.send("💥 Playlist has been reset. All tracks removed.")
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] {e}")
         await ctx.send(f"Error: {str(e)}")
 
@@ -849,9 +2639,11 @@ async def remove_track(ctx, *, query: str):
             await ctx.send("No playlist linked to this channel.")
             return
 
-        # New structure check
+        if submission_index.count(gid, playlist_id, user_id) == 0:
+            await ctx.send("You have not submitted any tracks.")
+            return
 
-        playlist_items = get_all_playlist_tracks(sp, playlist_id) # type: ignore
+        playlist_items = await playlist_mirror.get_items(playlist_id)
         # print(f"[DEBUG] Guild ID: {gid}")
         # print(f"[DEBUG] Playlist ID: {playlist_id}")
         # print(f"[DEBUG] User ID: {user_id}")
@@ -859,33 +2651,19 @@ async def remove_track(ctx, *, query: str):
         # print(f"[DEBUG] user_submissions[gid] keys: {list(user_submissions.get(gid, {}).keys())}")
         # print(f"[DEBUG] user_submissions[gid][playlist_id] keys: {list(user_submissions.get(gid, {}).get(playlist_id, {}).keys())}")
 
-        print(user_submissions)
-
-        submitted_ids = set(user_submissions[gid][playlist_id][user_id])
-
-        # print(f"[DEBUG] Submitted IDs: {submitted_ids}")
+        # print(f"[DEBUG] Submitted IDs: {user_submissions[gid][playlist_id][user_id]}")
         # for item in playlist_items:
         #     print(f"[DEBUG] Track in playlist: {item['track']['name']} - {item['track']['id']}")
 
-
-        if gid not in user_submissions or \
-           playlist_id not in user_submissions[gid] or \
-           user_id not in user_submissions[gid][playlist_id]:
-            await ctx.send("You have not submitted any tracks.")
-            return
-
-
         for item in playlist_items:
             track = item["track"]
             track_id = track["id"]
             full_string = f"{track['name']} - {track['artists'][0]['name']}".lower()
 
-            if track_id in submitted_ids and query.lower() in full_string:
-                sp.playlist_remove_all_occurrences_of_items(playlist_id, [track_id])
-                user_submissions[gid][playlist_id][user_id].remove(track_id)
-
-                with open(SUBMISSIONS_FILE, "w") as f:
-                    json.dump(user_submissions, f)
+            if submission_index.owner(gid, playlist_id, track_id) == user_id and query.lower() in full_string:
+                await spotify.playlist_remove_all_occurrences_of_items(playlist_id, [track_id])
+                drop_submission(gid, playlist_id, user_id, track_id)
+                playlist_mirror.remove_local(playlist_id, [track_id])
 
                 await ctx.send(f"🗑️ Removed: **{track['name']}** by {track['artists'][0]['name']}")
                 return
@@ -893,63 +2671,76 @@ async def remove_track(ctx, *, query: str):
         await ctx.send("Could not find a matching track in your submissions.")
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] {e}")
         await ctx.send(f"Error: {str(e)}")
 
+LEADERBOARD_SCOPES = {
+    "playlist": "playlist", "p": "playlist",
+    "guild": "guild", "server": "guild", "g": "guild",
+    "alltime": "alltime", "all-time": "alltime", "all": "alltime", "a": "alltime",
+}
+LEADERBOARD_TITLES = {
+    "playlist": "**🎧 Submission Leaderboard:**",
+    "guild": "**🎧 Server Leaderboard:**",
+    "alltime": "**🏆 All-Time Leaderboard:**",
+}
+
+
 @bot.command(name="leaderboard", aliases=["lb"])
-async def leaderboard(ctx):
+async def leaderboard(ctx, scope: str = "playlist"):
     try:
         gid = str(ctx.guild.id)
-        channel_name = ctx.channel.name
-        playlist_id = playlist_map.get(str(ctx.channel.id))
+        user_id = str(ctx.author.id)
+        scope = LEADERBOARD_SCOPES.get(scope.lower())
+        if scope is None:
+            await ctx.send("Usage: `!leaderboard [playlist|guild|alltime]`")
+            return
 
-        if not playlist_id:
+        playlist_id = playlist_map.get(str(ctx.channel.id))
+        if scope == "playlist" and not playlist_id:
             await ctx.send("No playlist linked to this channel.")
             return
 
-        submission_data = user_submissions.get(gid, {}).get(playlist_id, {})
-        if not submission_data:
+        board = leaderboards.board(scope, gid, playlist_id)
+        if not board:
             await ctx.send("No submissions yet.")
             return
 
-        leaderboard_data = []
-
-        for user_id, tracks in submission_data.items():
-            count = len(tracks)
-            try:
-                member = await ctx.guild.fetch_member(int(user_id))
-                name = member.display_name
-            except:
-                name = f"👻 Unknown User"
-            leaderboard_data.append((name, count))
+        top = board.top(LEADERBOARD_SIZE)
+        names = await member_names.resolve(ctx.guild, [u for u, _ in top])
 
-        # Sort descending by count
-        leaderboard_data.sort(key=lambda x: x[1], reverse=True)
+        msg_lines = [LEADERBOARD_TITLES[scope]]
+        for i, (member_id, count) in enumerate(top, 1):
+            msg_lines.append(f"{i}. {names[member_id]} — {count} track{'s' if count != 1 else ''}")
 
-        msg_lines = ["**🎧 Submission Leaderboard:**"]
-        for i, (name, count) in enumerate(leaderboard_data, 1):
-            msg_lines.append(f"{i}. {name} — {count} track{'s' if count != 1 else ''}")
+        rank = board.rank(user_id)
+        if rank is not None and rank > LEADERBOARD_SIZE:
+            count = board.counts[user_id]
+            msg_lines.append(f"…\nYou're #{rank} of {len(board)} with {count} track{'s' if count != 1 else ''}.")
 
         await ctx.send("\n".join(msg_lines))
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] {e}")
         await ctx.send(f"Error: {str(e)}")
 
 
-def is_user(user_id):
-    return str(user_id) in permissions.get("users", []) or is_organizer(user_id) # type: ignore
+@bot.event
+async def on_member_update(before, after):
+    member_names.invalidate(after.guild.id, after.id)
 
-def is_administrator(gid, uid):
-    return str(uid) in permissions.get(str(gid), {}).get("administrators", [])
 
-def is_organizer(gid, uid):
-    return str(uid) in permissions.get(str(gid), {}).get("organizers", [])
+@bot.event
+async def on_member_remove(member):
+    member_names.invalidate(member.guild.id, member.id)
 
 
 @bot.event
 async def on_ready():
-    print(f"[READY] Logged in as {bot.user} (ID: {bot.user.id})") # type: ignore
+    print(f"[READY] Logged in as {bot.user} (ID: {bot.user.id}), shards {sorted(bot.shards)} of {bot.shard_count}") # type: ignore
+    poll_scheduler.rehydrate()
     updated = False
 
     for guild in bot.guilds:
@@ -971,12 +2762,7 @@ async def on_ready():
     # Only save if something changed
     if updated:
         try:
-            import traceback
-            print("[DEBUG] Writing to permissions.json from on_ready()")
-            traceback.print_stack()
-
-            with open(PERMISSIONS_FILE, "w") as f:
-                json.dump(permissions, f, indent=4)
+            store.ensure_guilds([str(guild.id) for guild in bot.guilds])
             print("[DEBUG] Permissions saved after bot ready.")
         except Exception as e:
             print(f"[ERROR] Failed to save permissions: {e}")
@@ -990,26 +2776,11 @@ async def add_user_permission(ctx, member: discord.Member):
     uid = str(ctx.author.id)
     target_uid = str(member.id)
 
-    if not is_organizer(gid, uid) and not is_administrator(gid, uid):
+    if not is_organizer(gid, uid):
         await ctx.send("You do not have permission to assign roles.")
         return
 
-    # === Safely ensure all roles exist ===
-    if gid not in permissions:
-        permissions[gid] = {
-            "administrators": [],
-            "organizers": [],
-            "users": []
-        }
-    else:
-        for key in ["administrators", "organizers", "users"]:
-            if key not in permissions[gid]:
-                permissions[gid][key] = []
-
-    if target_uid not in permissions[gid]["users"]:
-        permissions[gid]["users"].append(target_uid)
-        with open(PERMISSIONS_FILE, "w") as f:
-            json.dump(permissions, f, indent=4)
+    grant_permission(gid, "users", target_uid)
 
     await ctx.send(f"✅ User `{member.display_name}` granted user permissions.")
 
@@ -1020,27 +2791,11 @@ async def add_organizer_permission(ctx, member: discord.Member):
     target_uid = str(member.id)
 
     # ✅ Allow both organizers and admins to assign organizer role
-    if not is_organizer(gid, uid) and not is_administrator(gid, uid):
+    if not is_organizer(gid, uid):
         await ctx.send("You do not have permission to assign organizer roles.")
         return
 
-    # ✅ Safely ensure permissions structure
-    if gid not in permissions:
-        permissions[gid] = {
-            "administrators": [],
-            "organizers": [],
-            "users": []
-        }
-    else:
-        for key in ["administrators", "organizers", "users"]:
-            if key not in permissions[gid]:
-                permissions[gid][key] = []
-
-    # ✅ Add the user if they’re not already an organizer
-    if target_uid not in permissions[gid]["organizers"]:
-        permissions[gid]["organizers"].append(target_uid)
-        with open(PERMISSIONS_FILE, "w") as f:
-            json.dump(permissions, f, indent=4)
+    grant_permission(gid, "organizers", target_uid)
 
     await ctx.send(f"👑 User `{member.display_name}` granted organizer permissions.")
 
@@ -1051,27 +2806,11 @@ async def add_administrator_permission(ctx, member: discord.Member):
     target_uid = str(member.id)
 
     # ✅ Allow both organizers and admins to assign organizer role
-    if not is_organizer(gid, uid) and not is_administrator(gid, uid):
+    if not is_organizer(gid, uid):
         await ctx.send("You do not have permission to assign organizer roles.")
         return
 
-    # ✅ Safely ensure permissions structure
-    if gid not in permissions:
-        permissions[gid] = {
-            "administrators": [],
-            "organizers": [],
-            "users": []
-        }
-    else:
-        for key in ["administrators", "organizers", "users"]:
-            if key not in permissions[gid]:
-                permissions[gid][key] = []
-
-    # ✅ Add the user if they’re not already an Admin
-    if target_uid not in permissions[gid]["administrators"]:
-        permissions[gid]["administrators"].append(target_uid)
-        with open(PERMISSIONS_FILE, "w") as f:
-            json.dump(permissions, f, indent=4)
+    grant_permission(gid, "administrators", target_uid)
 
     await ctx.send(f"🤖 User `{member.display_name}` granted administrator permissions.")
 
@@ -1117,7 +2856,7 @@ async def start_wheel(ctx, seconds: int = 60):
     gid = str(ctx.guild.id)
     uid = str(ctx.author.id)
 
-    if not (is_organizer(gid, uid) or is_administrator(gid, uid)):
+    if not is_organizer(gid, uid):
         await ctx.send("🚫 You do not have permission to start the wheel.")
         return
 
@@ -1153,8 +2892,289 @@ async def start_wheel(ctx, seconds: int = 60):
     await ctx.send(f"🎉 **{winner.mention} has been chosen by the Wheel of Fate!**")
 
 
-poll_votes = {}  # message_id: {emoji: count}
-user_votes = {} # message_id: {user_id: [emoji1, emoji2]}
+# Vote messages hold up to 10 entries each (one number emoji per entry);
+# bigger polls are split across several vote messages.
+VOTE_EMOJIS = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
+VOTES_PER_MESSAGE = len(VOTE_EMOJIS)
+VOTE_ENTRY_MAX_CHARS = 150
+REACTION_SEED_DELAY = float(os.getenv("REACTION_SEED_DELAY", "0.35"))  # seconds between bot reactions
+DISCORD_MESSAGE_LIMIT = 2000
+
+poll_locks = {}  # poll_key: asyncio.Lock()
+
+
+def vote_entry_index(poll, message_id, emoji):
+    try:
+        page = poll["vote_message_ids"].index(message_id)
+        slot = VOTE_EMOJIS.index(emoji)
+    except ValueError:
+        return None
+    index = page * VOTES_PER_MESSAGE + slot
+    return index if index < len(poll["entries"]) else None
+
+
+async def remove_vote_reaction(poll, entry, user_id):
+    channel = bot.get_channel(int(poll["channel_id"]))
+    message_id = poll["vote_message_ids"][entry // VOTES_PER_MESSAGE]
+    try:
+        message = channel.get_partial_message(message_id) # type: ignore
+        await message.remove_reaction(VOTE_EMOJIS[entry % VOTES_PER_MESSAGE], discord.Object(id=int(user_id)))
+    except Exception as e:
+        print(f"[ERROR] Failed to remove vote reaction: {e}")
+
+
+def chunk_lines(lines, limit=DISCORD_MESSAGE_LIMIT):
+    # Group lines into messages that fit Discord's character limit
+    chunk = []
+    size = 0
+    for line in lines:
+        if chunk and size + len(line) + 1 > limit:
+            yield "\n".join(chunk)
+            chunk = []
+            size = 0
+        chunk.append(line[:limit])
+        size += len(line) + 1
+    if chunk:
+        yield "\n".join(chunk)
+
+# === POLL SCHEDULER ===
+# Poll phase changes (submissions -> voting -> results) are deadlines in a
+# single heap served by one timer task, instead of a command coroutine
+# sleeping for minutes or days per poll. active_polls is persisted to
+# POLLS_FILE, and on_ready re-schedules whatever was running before a restart.
+POLLS_FILE = cluster_path("polls.json")
+
+
+class PollScheduler:
+    def __init__(self):
+        self.heap = []  # (deadline, seq, poll_key, phase)
+        self.seq = itertools.count()
+        self.wakeup = None
+        self.task = None
+        self.phase_tasks = set()
+        self.rehydrated = False
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    def schedule(self, deadline, poll_key, phase):
+        self.start()
+        heapq.heappush(self.heap, (deadline, next(self.seq), poll_key, phase))
+        self.wakeup.set()
+
+    def rehydrate(self):
+        if self.rehydrated:
+            return
+        self.rehydrated = True
+        for poll_key, poll in active_polls.items():
+            if poll["status"] == "voting" and "ends_at" not in poll:
+                # Went down while posting the vote messages; post them again
+                poll["status"] = "collecting"
+            elif poll["status"] == "ended":
+                # Went down while posting results; post them now
+                poll["status"] = "voting"
+            if poll["status"] == "collecting":
+                self.schedule(poll["starts_at"], poll_key, "start")
+            elif poll["status"] == "voting":
+                self.schedule(poll.get("ends_at", time.time()), poll_key, "end")
+        if active_polls:
+            print(f"[INFO] Rescheduled {len(active_polls)} poll(s).")
+
+    async def _run(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, poll_key, phase = heapq.heappop(self.heap)
+            # Entries are never removed early; stale ones are skipped here
+            poll = active_polls.get(poll_key)
+            if poll is None:
+                continue
+            if phase == "start" and poll["status"] == "collecting":
+                self._fire(start_poll(None, poll_key), poll_key, phase)
+            elif phase == "end" and poll["status"] == "voting":
+                self._fire(end_poll(None, poll_key), poll_key, phase)
+
+    def _fire(self, coro, poll_key, phase):
+        task = asyncio.create_task(coro)
+        self.phase_tasks.add(task)
+        task.add_done_callback(lambda t: self._phase_done(t, poll_key, phase))
+
+    def _phase_done(self, task, poll_key, phase):
+        self.phase_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[ERROR] Failed to {phase} poll '{poll_key}': {task.exception()}")
+
+    def prune(self):
+        # Drop queued phases for polls that no longer exist
+        live = [entry for entry in self.heap if entry[2] in active_polls]
+        pruned = len(self.heap) - len(live)
+        if pruned:
+            heapq.heapify(live)
+            self.heap = live
+        return pruned
+
+    def shutdown(self):
+        if self.task is not None:
+            self.task.cancel()
+        for task in self.phase_tasks:
+            task.cancel()
+
+
+# Message ID -> poll key, so on_message / on_reaction_add route in O(1)
+# instead of scanning every open poll. Kept in sync by the helpers below.
+poll_by_submission_message = {}
+poll_by_vote_message = {}
+
+
+def index_poll(poll_key):
+    poll = active_polls[poll_key]
+    poll_by_submission_message[poll["message_id"]] = poll_key
+    for message_id in poll.get("vote_message_ids", []):
+        poll_by_vote_message[message_id] = poll_key
+
+
+def remove_poll(poll_key):
+    poll = active_polls.pop(poll_key, None)
+    if poll is not None:
+        poll_by_submission_message.pop(poll["message_id"], None)
+        for message_id in poll.get("vote_message_ids", []):
+            poll_by_vote_message.pop(message_id, None)
+    poll_locks.pop(poll_key, None)
+    save_polls()
+
+
+def save_polls():
+    persistence.mark_dirty(POLLS_FILE)
+
+
+active_polls.update(read_json_file(POLLS_FILE))
+for _poll_key, _poll in active_polls.items():
+    if "vote_message_id" in _poll:
+        # Single-message poll saved before live tallies; counted from reactions when it ends
+        _poll["vote_message_ids"] = [_poll.pop("vote_message_id")]
+        _poll.pop("vote_emojis", None)
+        _poll["tallies"] = None
+    index_poll(_poll_key)
+persistence.register(POLLS_FILE, lambda: active_polls)
+poll_scheduler = PollScheduler()
+
+
+# === MEMORY SWEEPER ===
+# Long-running bots accumulate per-poll and per-playlist state; this drops
+# whatever outlived its owner. Polls still open POLL_EXPIRY_HOURS after
+# their deadline (e.g. the channel was deleted so they could never finish)
+# are expired too.
+MEMORY_SWEEP_MINUTES = float(os.getenv("MEMORY_SWEEP_MINUTES", "15"))
+POLL_EXPIRY_HOURS = float(os.getenv("POLL_EXPIRY_HOURS", "24"))
+
+
+def poll_deadline(poll):
+    if poll["status"] == "collecting":
+        return poll["starts_at"]
+    return poll.get("ends_at", poll["starts_at"] + poll["vote_duration"] * 60)
+
+
+def sweep_memory():
+    swept = {}
+
+    cutoff = time.time() - POLL_EXPIRY_HOURS * 3600
+    expired = [key for key, poll in active_polls.items() if poll_deadline(poll) < cutoff]
+    for poll_key in expired:
+        print(f"[INFO] Expiring stale poll '{poll_key}'.")
+        remove_poll(poll_key)
+    swept["polls"] = len(expired)
+
+    stale_locks = [key for key, lock in poll_locks.items() if key not in active_polls and not lock.locked()]
+    for poll_key in stale_locks:
+        del poll_locks[poll_key]
+    swept["poll_locks"] = len(stale_locks)
+
+    # Vote messages from an interrupted start that were posted again
+    stale_ids = [message_id for message_id, poll_key in poll_by_vote_message.items()
+                 if message_id not in active_polls.get(poll_key, {}).get("vote_message_ids", [])]
+    stale_ids += [message_id for message_id, poll_key in poll_by_submission_message.items()
+                  if poll_key not in active_polls]
+    for message_id in stale_ids:
+        poll_by_vote_message.pop(message_id, None)
+        poll_by_submission_message.pop(message_id, None)
+    swept["poll_index"] = len(stale_ids)
+
+    swept["poll_phases"] = poll_scheduler.prune()
+    swept["track_cache"] = track_cache.purge_expired()
+    swept["member_names"] = member_names.purge_expired()
+
+    idle_locks = [pid for pid, lock in playlist_mirror.locks.items() if not lock.locked()]
+    for playlist_id in idle_locks:
+        del playlist_mirror.locks[playlist_id]
+    swept["mirror_locks"] = len(idle_locks)
+    return swept
+
+
+@tasks.loop(minutes=MEMORY_SWEEP_MINUTES)
+async def memory_sweeper():
+    swept = sweep_memory()
+    if any(swept.values()):
+        print(f"[DEBUG] Memory sweep: {swept}")
+
+
+@memory_sweeper.before_loop
+async def before_memory_sweeper():
+    await bot.wait_until_ready()
+
+
+def approx_size(obj, seen=None):
+    # Rough deep sys.getsizeof; shared objects are counted once
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in obj)
+    return size
+
+
+def memory_report():
+    structures = {
+        "active_polls": active_polls,
+        "poll_locks": poll_locks,
+        "poll_index": (poll_by_submission_message, poll_by_vote_message),
+        "poll_phases": poll_scheduler.heap,
+        "user_submissions": user_submissions,
+        "submission_index": (submission_index.owners, submission_index.counts),
+        "permission_index": permission_index.roles,
+        "leaderboards": (leaderboards.playlists, leaderboards.guilds, leaderboards.alltime),
+        "track_cache": track_cache.entries,
+        "member_names": member_names.names,
+        "fmbot_replies": reply_resolver.parsed,
+        "playlist_mirror": playlist_mirror.playlists,
+        "mirror_locks": playlist_mirror.locks,
+        "pending_adds": playlist_adds.pending,
+        "art_jobs": art_jobs.jobs,
+        "spotify_queue": spotify_scheduler.heap,
+    }
+    report = {}
+    for name, obj in structures.items():
+        parts = obj if isinstance(obj, tuple) else (obj,)
+        report[name] = (sum(len(part) for part in parts), approx_size(obj))
+    return report
 
 
 def parse_duration(raw):
@@ -1188,7 +3208,7 @@ async def poll_command(ctx, *args):
             gid = str(ctx.guild.id)
             uid = str(ctx.author.id)
 
-            if not (is_administrator(gid, uid) or is_organizer(gid, uid)):
+            if not is_organizer(gid, uid):
                 await ctx.send("🚫 You do not have permission to manage this poll.")
                 return
 
@@ -1218,7 +3238,7 @@ async def poll_command(ctx, *args):
         uid = str(ctx.author.id)
 
         # Permission check
-        if not (is_administrator(gid, uid) or is_organizer(gid, uid)):
+        if not is_organizer(gid, uid):
             await ctx.send("🚫 You do not have permission to start a poll.")
             return
 
@@ -1233,7 +3253,6 @@ async def poll_command(ctx, *args):
             return
 
         # Create poll data
-        now = datetime.utcnow()
         message = await ctx.send(f"📝 **Poll '{poll_name}' is open for submissions!**\nReply to this message with your entry.\nYou can submit **{submission_limit}** item(s). Voting will begin in **{start_delay}** minutes.")
 
         active_polls[poll_key] = {
@@ -1241,106 +3260,196 @@ async def poll_command(ctx, *args):
             "channel_id": cid,
             "creator_id": uid,
             "submission_limit": submission_limit,
-            "start_time": now + timedelta(minutes=start_delay),
+            "starts_at": time.time() + start_delay * 60,
             "vote_duration": vote_duration,
             "vote_limit": vote_limit,
             "submissions": {},
             "status": "collecting",
             "message_id": message.id
         }
+        index_poll(poll_key)
+        save_polls()
 
         # Schedule the vote to start automatically
-        await asyncio.sleep(start_delay * 60)
-        if active_polls.get(poll_key, {}).get("status") == "collecting":
-            await start_poll(ctx, poll_key)
+        poll_scheduler.schedule(active_polls[poll_key]["starts_at"], poll_key, "start")
 
     except Exception as e:
+        ctx.command_failed = True
         print(f"[ERROR] Poll command failed: {e}")
         await ctx.send(f"Error: {str(e)}")
 
 
 async def start_poll(ctx, poll_key):
+    # ctx is None when the scheduler fires the phase change
     poll = active_polls.get(poll_key)
     if not poll:
         return
 
     if poll["status"] != "collecting":
-        await ctx.send("⚠️ Poll is already active or ended.")
+        if ctx:
+            await ctx.send("⚠️ Poll is already active or ended.")
+        return
+
+    channel = bot.get_channel(int(poll["channel_id"]))
+    if channel is None:
+        print(f"[WARN] Channel for poll '{poll_key}' no longer exists, dropping the poll")
+        remove_poll(poll_key)
         return
 
     poll["status"] = "voting"
+    save_polls()
 
     submissions = []
     for entries in poll["submissions"].values():
         submissions.extend(entries)
 
     if not submissions:
-        await ctx.send("⚠️ No submissions were received. Poll cancelled.")
-        active_polls.pop(poll_key, None)
+        await (ctx or channel).send("⚠️ No submissions were received. Poll cancelled.") # type: ignore
+        remove_poll(poll_key)
         return
 
-    channel = bot.get_channel(int(poll["channel_id"]))
-    message_lines = [f"🗳️ **Voting for '{poll_key}' has begun!** React to vote:"]
-
-    for i, entry in enumerate(submissions):
-        message_lines.append(f"{i+1}. {entry}")
-
-    vote_msg = await channel.send("\n".join(message_lines)) # type: ignore
+    poll["entries"] = submissions
+    poll["tallies"] = [0] * len(submissions)
+    poll["votes"] = {}  # user_id: [entry index, ...]
+    poll["vote_message_ids"] = []
+
+    # One vote message per 10 entries; index each as soon as it exists so early votes count
+    pages = [submissions[i:i + VOTES_PER_MESSAGE] for i in range(0, len(submissions), VOTES_PER_MESSAGE)]
+    vote_messages = []
+    for page_number, page in enumerate(pages):
+        if page_number == 0:
+            message_lines = [f"🗳️ **Voting for '{poll_key}' has begun!** React to vote:"]
+        else:
+            message_lines = [f"🗳️ **'{poll_key}' (continued, part {page_number + 1}/{len(pages)})**"]
+        for emoji, entry in zip(VOTE_EMOJIS, page):
+            message_lines.append(f"{emoji} {entry[:VOTE_ENTRY_MAX_CHARS]}")
 
-    # React with emojis
-    emojis = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
-    for i in range(len(submissions)):
-        await vote_msg.add_reaction(emojis[i])
+        vote_msg = await channel.send("\n".join(message_lines)) # type: ignore
+        poll["vote_message_ids"].append(vote_msg.id)
+        index_poll(poll_key)
+        vote_messages.append((vote_msg, len(page)))
 
-    # Store the vote message ID to use later
-    poll["vote_message_id"] = vote_msg.id
-    poll["vote_emojis"] = emojis[:len(submissions)]
-    poll["entries"] = submissions
+    poll["ends_at"] = time.time() + poll["vote_duration"] * 60
+    save_polls()
 
     # Schedule poll end
-    await asyncio.sleep(poll["vote_duration"] * 60)
-    if poll_key in active_polls:
-        await end_poll(ctx, poll_key)
+    poll_scheduler.schedule(poll["ends_at"], poll_key, "end")
+
+    # React with emojis, paced so seeding big polls doesn't hit Discord's reaction rate limit
+    for vote_msg, count in vote_messages:
+        for emoji in VOTE_EMOJIS[:count]:
+            try:
+                await vote_msg.add_reaction(emoji)
+            except Exception as e:
+                print(f"[ERROR] Failed to add vote reaction: {e}")
+            await asyncio.sleep(REACTION_SEED_DELAY)
 
 
 async def end_poll(ctx, poll_key):
     poll = active_polls.get(poll_key)
     if not poll or poll["status"] != "voting":
-        await ctx.send("⚠️ Poll is not currently active.")
+        if ctx:
+            await ctx.send("⚠️ Poll is not currently active.")
         return
 
-    poll["status"] = "ended"
-
     channel = bot.get_channel(int(poll["channel_id"]))
-    vote_msg = await channel.fetch_message(poll["vote_message_id"]) # type: ignore
+    if channel is None:
+        print(f"[WARN] Channel for poll '{poll_key}' no longer exists, dropping the poll")
+        remove_poll(poll_key)
+        return
 
-    vote_counts = {}
-    for reaction in vote_msg.reactions:
-        emoji = reaction.emoji
-        if emoji in poll["vote_emojis"]:
-            vote_counts[emoji] = reaction.count - 1  # Subtract bot's own reaction
+    poll["status"] = "ended"
+    save_polls()
+    legacy = poll["tallies"] is None
+    vote_counts = [0] * len(poll["entries"]) if legacy else list(poll["tallies"])
+
+    # Final reconciliation, one fetch per vote message: a counted vote can't
+    # outlive its reaction, so clamp to what is actually on the message
+    # (covers reaction removals we missed while offline).
+    for page, message_id in enumerate(poll["vote_message_ids"]):
+        try:
+            vote_msg = await channel.fetch_message(message_id) # type: ignore
+        except Exception as e:
+            print(f"[ERROR] Failed to fetch vote message {message_id}: {e}")
+            continue
+        live = {str(r.emoji): r.count - (1 if r.me else 0) for r in vote_msg.reactions}
+        for slot, emoji in enumerate(VOTE_EMOJIS):
+            index = page * VOTES_PER_MESSAGE + slot
+            if index >= len(vote_counts):
+                break
+            if legacy:
+                vote_counts[index] = max(0, live.get(emoji, 0))
+            else:
+                vote_counts[index] = max(0, min(vote_counts[index], live.get(emoji, 0)))
 
-    max_votes = max(vote_counts.values(), default=0)
-    winners = [emoji for emoji, count in vote_counts.items() if count == max_votes and count > 0]
+    max_votes = max(vote_counts, default=0)
+    winners = [i for i, count in enumerate(vote_counts) if count == max_votes and count > 0]
 
     result_lines = ["🏁 **Poll Results:**"]
-    for emoji in poll["vote_emojis"]:
-        entry = poll["entries"][poll["vote_emojis"].index(emoji)]
-        count = vote_counts.get(emoji, 0)
-        result_lines.append(f"{emoji} {entry} — {count} vote{'s' if count != 1 else ''}")
+    for i, entry in enumerate(poll["entries"]):
+        count = vote_counts[i]
+        result_lines.append(f"{i + 1}. {entry[:VOTE_ENTRY_MAX_CHARS]} — {count} vote{'s' if count != 1 else ''}")
 
     if winners:
         if len(winners) == 1:
-            winning_entry = poll["entries"][poll["vote_emojis"].index(winners[0])]
-            result_lines.append(f"\n🏆 **Winner:** {winning_entry} with {max_votes} vote{'s' if max_votes != 1 else ''}!")
+            winning_entry = poll["entries"][winners[0]]
+            result_lines.append(f"\n🏆 **Winner:** {winning_entry[:VOTE_ENTRY_MAX_CHARS]} with {max_votes} vote{'s' if max_votes != 1 else ''}!")
         else:
-            tied_entries = [poll["entries"][poll["vote_emojis"].index(e)] for e in winners]
+            tied_entries = [poll["entries"][i][:VOTE_ENTRY_MAX_CHARS] for i in winners]
             result_lines.append(f"\n🤝 **Tie between:** {', '.join(tied_entries)} with {max_votes} votes each!")
     else:
         result_lines.append("\n❌ No votes were cast.")
 
-    await channel.send("\n".join(result_lines)) # type: ignore
-    active_polls.pop(poll_key, None)
+    for chunk in chunk_lines(result_lines):
+        await channel.send(chunk) # type: ignore
+    remove_poll(poll_key)
+
+@bot.command(name="stats")
+async def bot_stats(ctx):
+    role = get_user_role(ctx.guild.id, ctx.author.id)
+    if not has_permission("stats", role):
+        await ctx.send("🚫 You don't have permission to view bot stats.")
+        return
+
+    cache = track_cache.stats()
+    mirror = playlist_mirror.stats()
+    sched = spotify_scheduler.stats()
+    jobs = art_jobs.stats()
+    depth = ", ".join(f"{name} {count}" for name, count in sched["queue_depth"].items())
+    waits = ", ".join(f"{name} {w['avg_wait'] * 1000:.0f}/{w['max_wait'] * 1000:.0f}ms" for name, w in sched["waits"].items())
+    lines = [
+        "**📈 Bot Stats**",
+        f"Track cache: {cache['entries']} entries, {cache['hits']} hits / {cache['misses']} misses ({cache['hit_rate']:.0%} hit rate)",
+        f"Playlist mirror: {mirror['playlists']} playlists / {mirror['tracks']} tracks, {mirror['snapshot_checks']} snapshot checks, {mirror['refetches']} refetches",
+        f"Spotify queue: {depth} queued, {sched['in_flight']} in flight, {sched['throttled']} rate-limited, backoff {sched['backoff_remaining']:.0f}s",
+        f"Spotify wait avg/max: {waits}",
+        f"Batched adds: {playlist_adds.tracks} tracks in {playlist_adds.batches} Spotify calls",
+        f"Reply lookups: {reply_resolver.hits} from cache, {reply_resolver.fetches} fetched",
+        f"Art jobs: {jobs['queued']} queued, {jobs['running']} running, {jobs['completed']} done, {jobs['failed']} failed, {jobs['collapsed']} duplicate requests collapsed",
+        f"Storage: {STORAGE_BACKEND}, {persistence.marks} JSON saves coalesced into {persistence.writes} writes",
+    ]
+    await ctx.send("\n".join(lines))
+
+
+@bot.command(name="memstats")
+async def memstats(ctx):
+    role = get_user_role(ctx.guild.id, ctx.author.id)
+    if not has_permission("memstats", role):
+        await ctx.send("🚫 You don't have permission to view memory stats.")
+        return
+
+    lines = ["**🧠 Memory**"]
+    for name, (count, size) in memory_report().items():
+        lines.append(f"{name}: {count} objects, ~{size / 1024:.1f} KB")
+    lines.append(f"GC tracked objects: {len(gc.get_objects())}")
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        lines.append(f"Peak RSS: {peak / 1024:.1f} MB")
+    except ImportError:
+        pass
+    await ctx.send("\n".join(lines))
+
 
 @bot.command(name="lphelp")
 async def lphelp_command(ctx):
@@ -1358,17 +3467,19 @@ async def lphelp_command(ctx):
         "**🚫 Removing Songs**\n"
         "`!remove <song title>` - Remove your submission\n\n"
         "**📊 Playlist Info & Limits**\n"
-        "`!status` - Playlist size and your submissions\n"
+        "`!status [page]` - Playlist submissions, a page at a time\n"
         "`!quota <#>` - Set submission quota (organizers only)\n"
         "`!limit <#>` - Set track duration limit in minutes (organizers only)\n"
         "`!quota` / `!limit` - View current limits\n\n"
         "**📈 Leaderboard**\n"
-        "`!leaderboard` - See top contributors\n\n"
+        "`!leaderboard [playlist|guild|alltime]` - See top contributors\n\n"
         "**🕵️ Permissions**\n"
         "`!user @name` - Grant user (organizers only)\n"
         "`!organizer @name` - Grant organizer (admins only)\n"
         "`!administrator @name` - Grant admin (admins only)\n"
-        "`!whoami` - Check your permission level\n\n"
+        "`!whoami` - Check your permission level\n"
+        "`!stats` - Show cache and performance counters (admins only)\n"
+        "`!memstats` - Show in-memory state sizes (admins only)\n\n"
         "**🎨 Art Settings**\n"
         "`!art on/off` - Enable or disable art (admins only)\n"
         "`!prompt` - Generate an AI art prompt"
@@ -1381,8 +3492,72 @@ async def lphelp_command(ctx):
     )
     await ctx.send(help_text)
 
-print("[BEFORE RUN] Permissions content:")
-print(json.dumps(permissions, indent=2))
+# === CLUSTER MODE ===
+def recommended_shard_count():
+    response = requests.get(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {DISCORD_TOKEN}"},
+        timeout=HTTP_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()["shards"]
+
+
+def run_cluster(workers):
+    if STORAGE_BACKEND != "sqlite":
+        print("[ERROR] Cluster mode needs STORAGE_BACKEND=sqlite so workers can share state.")
+        return 1
+
+    shard_count = SHARD_COUNT
+    if shard_count is None:
+        shard_count = max(workers, recommended_shard_count())
+    ranges = shard_ranges(shard_count, workers)
+    print(f"[CLUSTER] {shard_count} shard(s) across {len(ranges)} worker(s): {ranges}")
+
+    def spawn(cluster_id):
+        env = dict(os.environ,
+                   CLUSTER_ID=str(cluster_id),
+                   SHARD_COUNT=str(shard_count),
+                   SHARD_IDS=",".join(str(i) for i in ranges[cluster_id]))
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+
+    procs = {cluster_id: spawn(cluster_id) for cluster_id in range(len(ranges))}
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for proc in procs.values():
+            if proc.poll() is None:
+                proc.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while procs:
+            time.sleep(1)
+            for cluster_id, proc in list(procs.items()):
+                code = proc.poll()
+                if code is None:
+                    continue
+                if code == 0 or stopping:
+                    del procs[cluster_id]
+                    continue
+                print(f"[CLUSTER] Worker {cluster_id} exited with {code}; restarting in {CLUSTER_RESTART_DELAY:.0f}s.")
+                time.sleep(CLUSTER_RESTART_DELAY)
+                procs[cluster_id] = spawn(cluster_id)
+    except KeyboardInterrupt:
+        stop()
+        for proc in procs.values():
+            proc.wait()
+
+    return 0
+
+
+if __name__ == "__main__":
+    if CLUSTER_WORKERS and CLUSTER_ID is None:
+        sys.exit(run_cluster(CLUSTER_WORKERS))
 
+    print("[BEFORE RUN] Permissions content:")
+    print(json.dumps(permissions, indent=2))
 
-bot.run(DISCORD_TOKEN) # type: ignore
+    bot.run(DISCORD_TOKEN) # type: ignore
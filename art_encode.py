@@ -0,0 +1,40 @@
+# Cover art encoding for LPBot. Kept free of any bot state so it can run in
+# its own interpreter: LPBot pipes the downloaded image in on stdin and reads
+# the JPEG back from stdout.
+#
+#   python art_encode.py < image.png > cover.jpg
+import sys
+from io import BytesIO
+
+from PIL import Image
+
+SPOTIFY_COVER_MAX_BYTES = 256 * 1024  # Spotify's limit on the base64 payload
+ART_COVER_SIZE = 640
+ART_JPEG_QUALITIES = (90, 80, 70, 60, 50, 40, 30)
+
+
+def encode_cover_image(raw, size=ART_COVER_SIZE, max_bytes=SPOTIFY_COVER_MAX_BYTES):
+    img = Image.open(BytesIO(raw)).convert("RGB")
+    img.thumbnail((size, size), Image.LANCZOS)
+    for quality in ART_JPEG_QUALITIES:
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        data = buffer.getvalue()
+        # base64 grows the payload by 4/3
+        if (len(data) + 2) // 3 * 4 <= max_bytes:
+            return data
+    raise ValueError("Could not compress cover art under Spotify's 256 KB limit")
+
+
+def main():
+    try:
+        data = encode_cover_image(sys.stdin.buffer.read())
+    except Exception as e:
+        print(e, file=sys.stderr)
+        return 1
+    sys.stdout.buffer.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
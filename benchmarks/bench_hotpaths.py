@@ -0,0 +1,211 @@
+# Offline microbenchmarks for LPBot's data paths.
+#
+# Imports LPBot without connecting to Discord or Spotify (dummy credentials,
+# scratch working directory), fills it with a synthetic guild and times the
+# hot paths. Results are appended to a JSON file keyed by version so runs can
+# be compared across commits:
+#
+#   python benchmarks/bench_hotpaths.py
+#   python benchmarks/bench_hotpaths.py --label before-change --repeat 7
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeChannel, FakeContext, FakeEmbed, FakeGuild, FakeMessage, FakeUser  # noqa: E402
+
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "bench_results.json")
+
+SUBMISSIONS = 10_000
+USERS = 500
+PLAYLIST_TRACKS = 5_000
+GUILD_ID = 111111111111111111
+CHANNEL_ID = 222222222222222222
+PLAYLIST_ID = "benchplaylist"
+
+
+def import_lpbot():
+    os.environ.setdefault("YOUR_DISCORD_TOKEN", "bench")
+    os.environ.setdefault("YOUR_SPOTIFY_CLIENT_ID", "bench")
+    os.environ.setdefault("YOUR_SPOTIFY_CLIENT_SECRET", "bench")
+    os.environ.setdefault("YOUR_SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8888/callback")
+    os.environ["TRACK_CACHE_PERSIST"] = "0"
+    os.chdir(tempfile.mkdtemp(prefix="lpbot-bench-"))
+    sys.path.insert(0, REPO_ROOT)
+    import LPBot
+    return LPBot
+
+
+def current_version():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def make_track(n):
+    return {
+        "id": f"track{n:06d}",
+        "name": f"Song {n}",
+        "duration_ms": 180_000 + n,
+        "artists": [{"name": f"Artist {n % 700}"}],
+        "album": {"name": f"Album {n % 300}", "images": []},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/track{n:06d}"},
+    }
+
+
+def populate(lp):
+    gid = str(GUILD_ID)
+    user_ids = [str(100000 + u) for u in range(USERS)]
+
+    # 10k submissions spread over the users; the first 5k tracks are also on the playlist
+    for n in range(SUBMISSIONS):
+        user_id = user_ids[n % USERS]
+        lp.user_submissions.setdefault(gid, {}).setdefault(PLAYLIST_ID, {}).setdefault(user_id, []).append(f"track{n:06d}")
+    lp.submission_index.build(lp.user_submissions)
+    lp.leaderboards.build(lp.user_submissions, {})
+    lp.playlist_map[str(CHANNEL_ID)] = PLAYLIST_ID
+    lp.submission_quotas.setdefault(gid, {})[str(CHANNEL_ID)] = 25
+
+    lp.permissions[gid] = {
+        "administrators": user_ids[:5],
+        "organizers": user_ids[5:50],
+        "users": user_ids[50:],
+    }
+    lp.permission_index.build(lp.permissions)
+
+    lp.playlist_mirror.playlists[PLAYLIST_ID] = {
+        "snapshot_id": "bench",
+        "items": [{"track": make_track(n)} for n in range(PLAYLIST_TRACKS)],
+    }
+
+    members = [FakeUser(int(u)) for u in user_ids]
+    guild = FakeGuild(GUILD_ID, members)
+    return gid, user_ids, FakeContext(guild, FakeChannel(CHANNEL_ID, guild), members[0])
+
+
+def time_sync(func, ops, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for i in range(ops):
+            func(i)
+        samples.append((time.perf_counter() - started) / ops)
+    return samples
+
+
+def time_async(loop, coro_func, ops, repeat):
+    async def run():
+        started = time.perf_counter()
+        for i in range(ops):
+            await coro_func(i)
+        return (time.perf_counter() - started) / ops
+    return [loop.run_until_complete(run()) for _ in range(repeat)]
+
+
+def run_benchmarks(lp, repeat):
+    gid, user_ids, ctx = populate(lp)
+    rng = random.Random(42)
+    track_ids = [f"track{rng.randrange(SUBMISSIONS * 2):06d}" for _ in range(1024)]
+    durations = ["15m", "2h", "1d", "45", "90m"]
+    fmbot = [FakeMessage(ctx.channel, embeds=[FakeEmbed(f"[Song {n}](https://www.last.fm/music/x/_/song{n})\nBy **Artist {n}** | *Album {n}*")])
+             for n in range(64)]
+    commands = ["add", "remove", "quota", "status", "reset", "stats"]
+
+    def duplicate_check(i):
+        lp.submission_index.owner(gid, PLAYLIST_ID, track_ids[i % 1024])
+
+    def quota_lookup(i):
+        quota = lp.submission_quotas.get(gid, {}).get(str(CHANNEL_ID), 2)
+        return lp.submission_index.count(gid, PLAYLIST_ID, user_ids[i % USERS]) >= quota
+
+    def permission_resolution(i):
+        role = lp.get_user_role(gid, user_ids[i % USERS])
+        return lp.has_permission(commands[i % len(commands)], role)
+
+    def parse_duration(i):
+        lp.parse_duration(durations[i % len(durations)])
+
+    def fmbot_parse(i):
+        lp.parse_fmbot_embed(fmbot[i % 64])
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return {
+            "duplicate_check": time_sync(duplicate_check, 100_000, repeat),
+            "quota_lookup": time_sync(quota_lookup, 100_000, repeat),
+            "permission_resolution": time_sync(permission_resolution, 100_000, repeat),
+            "parse_duration": time_sync(parse_duration, 50_000, repeat),
+            "fmbot_parse": time_sync(fmbot_parse, 50_000, repeat),
+            "status_render": time_async(loop, lambda i: lp.status(ctx), 200, repeat),
+            "leaderboard_sort": time_async(loop, lambda i: lp.leaderboard(ctx), 200, repeat),
+        }
+    finally:
+        loop.close()
+
+
+def summarize(samples):
+    return {
+        "median_us": statistics.median(samples) * 1e6,
+        "min_us": min(samples) * 1e6,
+        "runs": len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time LPBot's hot data paths offline.")
+    parser.add_argument("--label", help="version key for the results file (default: git describe)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON file results are stored in")
+    parser.add_argument("--no-save", action="store_true", help="print results without storing them")
+    args = parser.parse_args()
+
+    label = args.label or current_version()
+    results_path = os.path.abspath(args.results)
+    lp = import_lpbot()
+
+    results = {name: summarize(samples) for name, samples in run_benchmarks(lp, args.repeat).items()}
+
+    history = {}
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            history = json.load(f)
+    previous = next((history[key] for key in reversed(list(history)) if key != label), None)
+
+    print(f"LPBot benchmarks @ {label} ({SUBMISSIONS} submissions, {PLAYLIST_TRACKS}-track playlist)")
+    for name, result in results.items():
+        line = f"  {name:<24} {result['median_us']:>12.2f} us/op"
+        if previous and name in previous["results"]:
+            before = previous["results"][name]["median_us"]
+            line += f"   {(result['median_us'] - before) / before:+.1%} vs {previous['label']}"
+        print(line)
+
+    if not args.no_save:
+        history.pop(label, None)
+        history[label] = {
+            "label": label,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(results_path, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"Saved to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
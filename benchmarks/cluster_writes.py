@@ -0,0 +1,176 @@
+# Multi-process write check for cluster mode: several worker processes, each
+# configured the way run_cluster configures them (CLUSTER_ID, SHARD_COUNT,
+# SHARD_IDS), write guild state into one shared SQLite database at the same
+# time, and the supervisor checks every row landed.
+#
+#   python benchmarks/cluster_writes.py --guilds 1000 --workers 3 --shards 8
+#
+# Synthetic guilds are split between workers by shard range. Each worker runs
+# its guilds through LPBot's real code (an admin grant, the !quota and !limit
+# handlers, record_submission), so everything goes through the store and its
+# writer thread. This covers cross-process write contention and per-worker
+# state files. It does NOT cover gateway routing: no AutoShardedBot runs, and
+# guilds are dealt with LPBot's own shard_for_guild.
+#
+# Runs in a fresh scratch directory by default and refuses to touch a database
+# that already has data.
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import FakeChannel, FakeContext, FakeGuild, FakeUser  # noqa: E402
+
+DATA_TABLES = ("submissions", "playlist_map", "submission_quotas", "duration_limits", "art_settings",
+               "permissions", "guild_settings", "alltime_counts")
+
+
+def guild_ids(count):
+    # Snowflake-shaped IDs that spread evenly over the shards
+    return [str((1 << 40 | n) << 22) for n in range(count)]
+
+
+def expected(n):
+    # What each guild's writes should leave in the database: (quota, limit, submissions)
+    return 1 + n % 9, 3 + n % 7, 1 + n % 3
+
+
+def events_path(workdir, worker):
+    return os.path.join(workdir, f"cluster_writes.worker{worker}.json")
+
+
+def database_has_data(path):
+    if not os.path.exists(path):
+        return False
+    conn = sqlite3.connect(path)
+    try:
+        tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return any(conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+                   for table in DATA_TABLES if table in tables)
+    finally:
+        conn.close()
+
+
+def import_lpbot():
+    os.environ.setdefault("YOUR_DISCORD_TOKEN", "cluster-writes")
+    os.environ.setdefault("YOUR_SPOTIFY_CLIENT_ID", "cluster-writes")
+    os.environ.setdefault("YOUR_SPOTIFY_CLIENT_SECRET", "cluster-writes")
+    os.environ.setdefault("YOUR_SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8888/callback")
+    os.environ["TRACK_CACHE_PERSIST"] = "0"
+    sys.path.insert(0, REPO_ROOT)
+    import LPBot
+    return LPBot
+
+
+async def run_events(lp, events):
+    skipped = 0
+    for event in events:
+        gid = event["guild_id"]
+        if not lp.owns_guild(gid):
+            skipped += 1
+            print(f"[ERROR] Worker {lp.CLUSTER_ID} got guild {gid}, outside its shards {lp.SHARD_IDS}.")
+            continue
+
+        quota, limit, submitted = expected(event["n"])
+        admin = FakeUser(int(gid) + 1)
+        guild = FakeGuild(int(gid), [admin])
+        ctx = FakeContext(guild, FakeChannel(int(gid) + 2, guild), admin)
+        lp.ensure_permissions_structure(gid)
+        lp.grant_permission(gid, "administrators", str(admin.id))
+        await lp.set_quota(ctx, quota)
+        await lp.set_limit(ctx, limit)
+        for k in range(submitted):
+            lp.record_submission(gid, f"playlist{event['n']}", str(admin.id + 10 + k), f"track{k}")
+    return skipped
+
+
+def run_worker(workdir, worker):
+    os.chdir(workdir)
+    with open(events_path(workdir, worker)) as f:
+        events = json.load(f)
+    lp = import_lpbot()
+    started = time.perf_counter()
+    skipped = asyncio.run(run_events(lp, events))
+    lp.store.close()  # waits for the writer thread to drain
+    print(f"[WORKER {worker}] shards {lp.SHARD_IDS}: {len(events) - skipped}/{len(events)} guild(s) "
+          f"in {time.perf_counter() - started:.2f}s")
+    return 1 if skipped else 0
+
+
+def check(database, guilds):
+    conn = sqlite3.connect(database)
+    quotas = dict(conn.execute("SELECT guild_id, quota FROM submission_quotas"))
+    limits = dict(conn.execute("SELECT guild_id, minutes FROM duration_limits"))
+    admins = {gid for gid, in conn.execute("SELECT guild_id FROM permissions WHERE role = 'administrators'")}
+    submitted = dict(conn.execute("SELECT guild_id, COUNT(*) FROM submissions GROUP BY guild_id"))
+    alltime = dict(conn.execute("SELECT guild_id, SUM(count) FROM alltime_counts GROUP BY guild_id"))
+    conn.close()
+
+    wrong = 0
+    for n, gid in enumerate(guild_ids(guilds)):
+        quota, limit, count = expected(n)
+        if (quotas.get(gid), limits.get(gid), gid in admins, submitted.get(gid), alltime.get(gid)) != (quota, limit, True, count, count):
+            wrong += 1
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check concurrent writes from cluster-mode workers to one database.")
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--workdir", help="directory for the database and worker files (default: a fresh temp dir)")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        sys.exit(run_worker(args.workdir, args.worker))
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="lpbot-cluster-")
+    os.makedirs(workdir, exist_ok=True)
+    database = os.path.join(workdir, "lpbot.db")
+    if database_has_data(database):
+        print(f"Refusing to run: {database} already has data. Use an empty --workdir.")
+        sys.exit(2)
+
+    os.chdir(workdir)
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["DATABASE_FILE"] = database
+    lp = import_lpbot()
+    ranges = lp.shard_ranges(args.shards, args.workers)
+    worker_for_shard = {shard: worker for worker, shards in enumerate(ranges) for shard in shards}
+    events = [[] for _ in ranges]
+    for n, gid in enumerate(guild_ids(args.guilds)):
+        events[worker_for_shard[lp.shard_for_guild(gid, args.shards)]].append({"n": n, "guild_id": gid})
+    for worker, worker_events in enumerate(events):
+        with open(events_path(workdir, worker), "w") as f:
+            json.dump(worker_events, f)
+    lp.store.close()
+
+    print(f"{args.guilds} guilds, {args.shards} shards across {len(ranges)} workers {ranges}, database {database}")
+    started = time.perf_counter()
+    procs = []
+    for worker, shards in enumerate(ranges):
+        env = dict(os.environ, CLUSTER_ID=str(worker), SHARD_COUNT=str(args.shards),
+                   SHARD_IDS=",".join(str(s) for s in shards))
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker", str(worker), "--workdir", workdir], env=env))
+    failed_workers = sum(1 for proc in procs if proc.wait() != 0)
+
+    wrong = check(database, args.guilds)
+    print(f"{args.guilds - wrong}/{args.guilds} guilds have all their rows "
+          f"({failed_workers} worker(s) failed) in {time.perf_counter() - started:.2f}s")
+    sys.exit(1 if wrong or failed_workers else 0)
+
+
+if __name__ == "__main__":
+    main()
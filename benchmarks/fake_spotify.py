@@ -0,0 +1,236 @@
+# Local stand-in for the parts of the Spotify Web API LPBot uses, for load
+# and fault testing without touching real Spotify.
+#
+#   python benchmarks/fake_spotify.py --port 8900 --latency-ms 80 --rate-429 0.02 --rate-5xx 0.01
+#
+# then start the bot (or benchmarks/load_harness.py) with
+#
+#   SPOTIFY_API_URL=http://127.0.0.1:8900/v1/
+#
+# Any bearer token is accepted. Search results and track metadata are
+# generated deterministically from the query / track ID, playlists live in
+# memory. GET /_stats returns request counts per endpoint and injected faults.
+import argparse
+import asyncio
+import hashlib
+import itertools
+import random
+import threading
+
+from aiohttp import web
+
+PAGE_LIMIT = 100
+
+
+def fake_id(seed):
+    # Spotify IDs are base62; a hex digest is too
+    return hashlib.sha1(seed.encode()).hexdigest()[:22]
+
+
+def make_track(track_id, long_ratio=0.05):
+    digest = int(hashlib.sha1(track_id.encode()).hexdigest(), 16)
+    rng = random.Random(digest)
+    duration_ms = rng.randint(8 * 60, 12 * 60) * 1000 if rng.random() < long_ratio else rng.randint(120, 360) * 1000
+    return {
+        "id": track_id,
+        "name": f"Song {track_id[:6]}",
+        "uri": f"spotify:track:{track_id}",
+        "duration_ms": duration_ms,
+        "artists": [{"name": f"Artist {digest % 997}"}],
+        "album": {
+            "name": f"Album {digest % 331}",
+            "images": [{"url": f"https://i.scdn.co/image/{track_id}", "width": 640, "height": 640}],
+        },
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+    }
+
+
+class FakeSpotify:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, rate_429=0.0, retry_after=1, rate_5xx=0.0,
+                 long_ratio=0.05, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_5xx = rate_5xx
+        self.long_ratio = long_ratio
+        self.rng = random.Random(seed)
+        self.playlists = {}  # playlist_id: {"name": str, "tracks": [track_id], "snapshot": int, "image_bytes": int}
+        self.playlist_ids = itertools.count(1)
+        self.requests = {}  # endpoint: count
+        self.faults = {"429": 0, "5xx": 0}
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.fault_middleware], client_max_size=1024 ** 2)
+        app.router.add_get("/v1/search", self.search)
+        app.router.add_get("/v1/tracks/{track_id}", self.track)
+        app.router.add_get("/v1/me", self.me)
+        app.router.add_get("/v1/me/", self.me)  # spotipy calls "me/"
+        app.router.add_post("/v1/users/{user_id}/playlists", self.create_playlist)
+        app.router.add_get("/v1/playlists/{playlist_id}", self.playlist)
+        app.router.add_get("/v1/playlists/{playlist_id}/tracks", self.playlist_items)
+        app.router.add_post("/v1/playlists/{playlist_id}/tracks", self.add_items)
+        app.router.add_delete("/v1/playlists/{playlist_id}/tracks", self.remove_items)
+        app.router.add_put("/v1/playlists/{playlist_id}/images", self.upload_cover)
+        app.router.add_get("/_stats", self.stats)
+        return app
+
+    @web.middleware
+    async def fault_middleware(self, request, handler):
+        if request.path.startswith("/_"):
+            return await handler(request)
+
+        resource = request.match_info.route.resource
+        endpoint = f"{request.method} {resource.canonical if resource else request.path}"
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+        delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        roll = self.rng.random()
+        if roll < self.rate_429:
+            self.faults["429"] += 1
+            return web.json_response({"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                     status=429, headers={"Retry-After": str(self.retry_after)})
+        if roll < self.rate_429 + self.rate_5xx:
+            self.faults["5xx"] += 1
+            return web.json_response({"error": {"status": 503, "message": "Service unavailable"}}, status=503)
+        return await handler(request)
+
+    def get_playlist(self, request):
+        playlist = self.playlists.get(request.match_info["playlist_id"])
+        if playlist is None:
+            raise web.HTTPNotFound(text='{"error": {"status": 404, "message": "Not found."}}',
+                                   content_type="application/json")
+        return playlist
+
+    def playlist_object(self, playlist_id, playlist):
+        return {
+            "id": playlist_id,
+            "name": playlist["name"],
+            "snapshot_id": str(playlist["snapshot"]),
+            "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"},
+            "tracks": {"total": len(playlist["tracks"])},
+        }
+
+    async def search(self, request):
+        query = request.query.get("q", "")
+        limit = min(int(request.query.get("limit", 10)), 50)
+        items = [make_track(fake_id(f"{query}:{n}"), self.long_ratio) for n in range(limit)]
+        return web.json_response({"tracks": {"items": items, "total": limit, "limit": limit, "offset": 0, "next": None}})
+
+    async def track(self, request):
+        return web.json_response(make_track(request.match_info["track_id"], self.long_ratio))
+
+    async def me(self, request):
+        return web.json_response({"id": "lpbot", "display_name": "LPBot"})
+
+    async def create_playlist(self, request):
+        body = await request.json()
+        playlist_id = fake_id(f"playlist:{next(self.playlist_ids)}")
+        self.playlists[playlist_id] = {"name": body.get("name", ""), "tracks": [], "snapshot": 1, "image_bytes": 0}
+        return web.json_response(self.playlist_object(playlist_id, self.playlists[playlist_id]), status=201)
+
+    async def playlist(self, request):
+        playlist = self.get_playlist(request)
+        return web.json_response(self.playlist_object(request.match_info["playlist_id"], playlist))
+
+    async def playlist_items(self, request):
+        playlist = self.get_playlist(request)
+        offset = int(request.query.get("offset", 0))
+        limit = min(int(request.query.get("limit", PAGE_LIMIT)), PAGE_LIMIT)
+        page = playlist["tracks"][offset:offset + limit]
+        next_url = None
+        if offset + limit < len(playlist["tracks"]):
+            next_url = str(request.url.update_query({"offset": offset + limit, "limit": limit}))
+        return web.json_response({
+            "items": [{"track": make_track(track_id, self.long_ratio)} for track_id in page],
+            "total": len(playlist["tracks"]),
+            "limit": limit,
+            "offset": offset,
+            "next": next_url,
+        })
+
+    async def add_items(self, request):
+        playlist = self.get_playlist(request)
+        body = await request.json()
+        uris = body if isinstance(body, list) else body.get("uris", [])
+        if len(uris) > PAGE_LIMIT:
+            return web.json_response({"error": {"status": 400, "message": "Too many tracks"}}, status=400)
+        track_ids = [uri.split(":")[-1] for uri in uris]
+        position = request.query.get("position")
+        if position is None:
+            playlist["tracks"].extend(track_ids)
+        else:
+            playlist["tracks"][int(position):int(position)] = track_ids
+        playlist["snapshot"] += 1
+        return web.json_response({"snapshot_id": str(playlist["snapshot"])}, status=201)
+
+    async def remove_items(self, request):
+        playlist = self.get_playlist(request)
+        body = await request.json()
+        removed = {entry["uri"].split(":")[-1] for entry in body.get("tracks", [])}
+        if len(removed) > PAGE_LIMIT:
+            return web.json_response({"error": {"status": 400, "message": "Too many tracks"}}, status=400)
+        playlist["tracks"] = [t for t in playlist["tracks"] if t not in removed]
+        playlist["snapshot"] += 1
+        return web.json_response({"snapshot_id": str(playlist["snapshot"])})
+
+    async def upload_cover(self, request):
+        playlist = self.get_playlist(request)
+        body = await request.read()
+        if len(body) > 256 * 1024:
+            return web.json_response({"error": {"status": 413, "message": "Image too large"}}, status=413)
+        playlist["image_bytes"] = len(body)
+        return web.Response(status=202)
+
+    async def stats(self, request):
+        return web.json_response({
+            "requests": self.requests,
+            "total": sum(self.requests.values()),
+            "faults": self.faults,
+            "playlists": len(self.playlists),
+        })
+
+
+def start_in_thread(fake, host="127.0.0.1", port=8900):
+    # Runs the server on its own event loop so it doesn't skew the caller's loop lag
+    ready = threading.Event()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(fake.make_app(), access_log=None)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=serve, name="fake-spotify", daemon=True)
+    thread.start()
+    ready.wait()
+    return f"http://{host}:{port}/v1/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Spotify Web API stand-in for LPBot.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0, help="added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="+/- random spread on the latency")
+    parser.add_argument("--rate-429", type=float, default=0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--rate-5xx", type=float, default=0, help="fraction of requests answered with 503")
+    parser.add_argument("--long-ratio", type=float, default=0.05, help="fraction of tracks longer than 8 minutes")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible fault injection")
+    args = parser.parse_args()
+
+    fake = FakeSpotify(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after, args.rate_5xx,
+                       args.long_ratio, args.seed)
+    print(f"Fake Spotify API on http://{args.host}:{args.port}/v1/ (stats at /_stats)")
+    web.run_app(fake.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
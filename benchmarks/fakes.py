@@ -0,0 +1,132 @@
+# Stand-ins for the discord.py objects LPBot's handlers touch, shared by the
+# offline microbenchmarks (bench_hotpaths.py), the load harness
+# (load_harness.py) and the cluster write check (cluster_writes.py). Every
+# simulated Discord API call bumps Counters.discord_calls and, when the object
+# was given a latency, sleeps for it.
+import asyncio
+import itertools
+
+message_ids = itertools.count(10 ** 17)
+
+
+class Counters:
+    discord_calls = 0
+
+
+class FakeUser:
+    def __init__(self, user_id, bot=False):
+        self.id = user_id
+        self.bot = bot
+        self.display_name = f"user{user_id}"
+        self.name = self.display_name
+        self.mention = f"<@{user_id}>"
+        self.activities = []
+
+    def __str__(self):
+        return self.name
+
+
+class FakeReaction:
+    def __init__(self, emoji):
+        self.emoji = emoji
+        self.count = 1
+        self.me = True
+
+
+class FakeEmbed:
+    def __init__(self, description):
+        self.description = description
+
+
+class FakeMessage:
+    def __init__(self, channel, content="", author=None, reference=None, embeds=None, latency=0.0):
+        self.id = next(message_ids)
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.author = author
+        self.reference = reference
+        self.embeds = embeds or []
+        self.reactions = []
+        self.latency = latency
+
+    async def add_reaction(self, emoji):
+        Counters.discord_calls += 1
+        await asyncio.sleep(self.latency)
+        self.reactions.append(FakeReaction(emoji))
+
+    async def remove_reaction(self, emoji, user):
+        Counters.discord_calls += 1
+        await asyncio.sleep(self.latency)
+        for reaction in self.reactions:
+            if reaction.emoji == emoji and reaction.count > 1:
+                reaction.count -= 1
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, latency=0.0):
+        self.id = channel_id
+        self.name = f"lp-{channel_id}"
+        self.guild = guild
+        self.latency = latency
+        self.messages = {}
+
+    async def send(self, content=None, **kwargs):
+        Counters.discord_calls += 1
+        await asyncio.sleep(self.latency)
+        message = FakeMessage(self, content or "", latency=self.latency)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id):
+        Counters.discord_calls += 1
+        await asyncio.sleep(self.latency)
+        return self.messages[message_id]
+
+    def get_partial_message(self, message_id):
+        return self.messages[message_id]
+
+
+class FakeGuild:
+    def __init__(self, guild_id, members):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.members = {m.id: m for m in members}
+        self.text_channels = []
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def query_members(self, user_ids=None, **kwargs):
+        Counters.discord_calls += 1
+        return [self.members[u] for u in user_ids if u in self.members]
+
+
+class FakeContext:
+    def __init__(self, guild, channel, author, reference=None):
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.message = FakeMessage(channel, author=author, reference=reference)
+        self.replies = []
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append(content)
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeReference:
+    # discord.MessageReference with nothing resolved or cached
+    def __init__(self, message_id):
+        self.message_id = message_id
+        self.resolved = None
+
+
+class FakePayload:
+    def __init__(self, message_id, user, emoji, channel):
+        self.message_id = message_id
+        self.user_id = user.id
+        self.member = user
+        self.emoji = emoji
+        self.channel_id = channel.id
+        self.guild_id = channel.guild.id
@@ -0,0 +1,282 @@
+# End-to-end load harness: drives LPBot's real command handlers through fake
+# Discord contexts for hundreds of guilds and thousands of users at once,
+# against the local Spotify stand-in (fake_spotify.py, started in-process on
+# its own thread), and reports per-command latency, event-loop lag, Spotify
+# and Discord calls per command, and peak RSS.
+#
+#   python benchmarks/load_harness.py --guilds 200 --users 20 --spotify-latency-ms 80
+#
+# Phases run one after another (add, status, remove, poll) with every
+# simulated user in a phase firing at once, so calls per command can be
+# attributed to a single command type.
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import fake_spotify  # noqa: E402
+from fakes import (Counters, FakeChannel, FakeContext, FakeGuild, FakeMessage, FakePayload,  # noqa: E402
+                   FakeReference, FakeUser)
+
+GUILD_BASE = 10 ** 16
+CHANNEL_BASE = 2 * 10 ** 16
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def take(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+    def stop(self):
+        self.task.cancel()
+
+
+def import_lpbot(api_url, seed_delay, spotify_rate):
+    os.environ.setdefault("YOUR_DISCORD_TOKEN", "harness")
+    os.environ.setdefault("YOUR_SPOTIFY_CLIENT_ID", "harness")
+    os.environ.setdefault("YOUR_SPOTIFY_CLIENT_SECRET", "harness")
+    os.environ.setdefault("YOUR_SPOTIFY_REDIRECT_URI", "http://127.0.0.1:8888/callback")
+    os.environ["SPOTIFY_API_URL"] = api_url
+    os.environ["TRACK_CACHE_PERSIST"] = "0"
+    os.environ["REACTION_SEED_DELAY"] = str(seed_delay)
+    os.environ["SPOTIFY_RATE"] = str(spotify_rate)
+    os.environ["SPOTIFY_BURST"] = str(max(1, int(spotify_rate * 2)))
+    os.chdir(tempfile.mkdtemp(prefix="lpbot-load-"))
+    sys.path.insert(0, REPO_ROOT)
+    import LPBot
+    return LPBot
+
+
+def spotify_calls(lp):
+    return sum(v for labels, v in lp.EXTERNAL_TOTAL.values.items() if labels[0] == "spotify")
+
+
+class Harness:
+    def __init__(self, lp, fake, args):
+        self.lp = lp
+        self.fake = fake
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.lag = LoopLagMonitor()
+        self.results = []
+        self.guilds = []  # (guild, channel, users)
+        self.channels = {}
+
+    async def setup(self):
+        lp = self.lp
+        # The bot user; reactions from it are ignored by the vote handler
+        lp.bot._connection.user = FakeUser(1, bot=True)
+        lp.bot.get_channel = self.channels.get
+        # on_message hands every message to bot.process_commands, which reads message._state
+        FakeMessage._state = lp.bot._connection
+
+        user_ids = itertools.count(10 ** 15)
+        for n in range(self.args.guilds):
+            gid = GUILD_BASE + n
+            users = [FakeUser(next(user_ids)) for _ in range(self.args.users)]
+            guild = FakeGuild(gid, users)
+            channel = FakeChannel(CHANNEL_BASE + n, guild, self.args.discord_latency_ms / 1000)
+            self.channels[channel.id] = channel
+
+            # Created directly on the stand-in; setup isn't part of the measurement
+            playlist_id = fake_spotify.fake_id(f"load-playlist:{n}")
+            self.fake.playlists[playlist_id] = {"name": f"load {n}", "tracks": [], "snapshot": 1, "image_bytes": 0}
+            playlist = self.fake.playlist_object(playlist_id, self.fake.playlists[playlist_id])
+            lp.playlist_map[str(channel.id)] = playlist["id"]
+            lp.playlist_mirror.set_empty(playlist["id"], playlist["snapshot_id"])
+            lp.submission_quotas.setdefault(str(gid), {})[str(channel.id)] = self.args.adds_per_user
+            lp.grant_permission(str(gid), "organizers", str(users[0].id))
+            for user in users[1:]:
+                lp.grant_permission(str(gid), "users", str(user.id))
+            self.guilds.append((guild, channel, users))
+
+    async def timed(self, handler, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            await handler(*args, **kwargs)
+            ok = True
+        except Exception as e:
+            print(f"[HARNESS] {handler.__name__} raised {e!r}")
+            ok = False
+        return time.perf_counter() - started, ok
+
+    async def phase(self, name, calls):
+        spotify_before = spotify_calls(self.lp)
+        discord_before = Counters.discord_calls
+        self.lag.take()
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*calls)
+        wall = time.perf_counter() - started
+        latencies = [latency for latency, _ in outcomes]
+        count = len(outcomes)
+        lag = self.lag.take()
+        self.results.append({
+            "phase": name,
+            "commands": count,
+            "errors": sum(1 for _, ok in outcomes if not ok),
+            "wall_s": wall,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": max(latencies, default=0) * 1000,
+            "spotify_per_cmd": (spotify_calls(self.lp) - spotify_before) / count if count else 0,
+            "discord_per_cmd": (Counters.discord_calls - discord_before) / count if count else 0,
+            "loop_lag_p99_ms": percentile(lag, 99) * 1000,
+            "loop_lag_max_ms": max(lag, default=0) * 1000,
+        })
+
+    async def run(self):
+        lp = self.lp
+        await self.setup()
+        self.lag.start()
+
+        await self.phase("add", [
+            self.timed(lp.add_to_playlist, FakeContext(guild, channel, user),
+                       song_query=f"Song {user.id}-{k} - Artist {self.rng.randrange(1000)}")
+            for guild, channel, users in self.guilds for user in users for k in range(self.args.adds_per_user)
+        ])
+
+        await self.phase("status", [
+            self.timed(lp.status, FakeContext(guild, channel, self.rng.choice(users)))
+            for guild, channel, users in self.guilds for _ in range(self.args.status_per_guild)
+        ])
+
+        await self.phase("remove", [
+            self.timed(lp.remove_track, FakeContext(guild, channel, user), query="song")
+            for guild, channel, users in self.guilds for user in users[::4]
+        ])
+
+        # Polls: create, reply with entries, open voting, every user votes, close
+        poll_names = {guild.id: f"load{guild.id}" for guild, _, _ in self.guilds}
+        await self.phase("poll_create", [
+            self.timed(lp.poll_command, FakeContext(guild, channel, users[0]), poll_names[guild.id], "1", "60", "60", "1")
+            for guild, channel, users in self.guilds
+        ])
+
+        submissions = []
+        for guild, channel, users in self.guilds:
+            poll = lp.active_polls[poll_names[guild.id]]
+            reference = FakeReference(poll["message_id"])
+            for user in users[:self.args.poll_entries]:
+                message = FakeMessage(channel, f"entry from {user.id}", author=user, reference=reference)
+                submissions.append(self.timed(lp.on_message, message))
+        await self.phase("poll_submit", submissions)
+
+        await self.phase("poll_start", [
+            self.timed(lp.poll_command, FakeContext(guild, channel, users[0]), poll_names[guild.id], "start")
+            for guild, channel, users in self.guilds
+        ])
+
+        votes = []
+        for guild, channel, users in self.guilds:
+            poll = lp.active_polls.get(poll_names[guild.id])
+            if not poll or not poll.get("vote_message_ids"):
+                continue
+            entries = len(poll["entries"])
+            for user in users:
+                entry = self.rng.randrange(entries)
+                message_id = poll["vote_message_ids"][entry // lp.VOTES_PER_MESSAGE]
+                emoji = lp.VOTE_EMOJIS[entry % lp.VOTES_PER_MESSAGE]
+                for reaction in channel.messages[message_id].reactions:
+                    if reaction.emoji == emoji:
+                        reaction.count += 1
+                votes.append(self.timed(lp.on_raw_reaction_add, FakePayload(message_id, user, emoji, channel)))
+        await self.phase("poll_vote", votes)
+
+        await self.phase("poll_end", [
+            self.timed(lp.poll_command, FakeContext(guild, channel, users[0]), poll_names[guild.id], "stop")
+            for guild, channel, users in self.guilds
+        ])
+
+        self.lag.stop()
+        await lp.persistence.flush()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def report(harness, args, fake):
+    print(f"\nLPBot load: {args.guilds} guilds x {args.users} users, Spotify latency {args.spotify_latency_ms:.0f}ms, "
+          f"rate limit {args.spotify_rate:.0f}/s, 429 rate {args.rate_429}, 5xx rate {args.rate_5xx}")
+    header = f"{'phase':<12} {'cmds':>6} {'err':>4} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'spotify/cmd':>12} {'discord/cmd':>12} {'lag p99':>8} {'lag max':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in harness.results:
+        print(f"{r['phase']:<12} {r['commands']:>6} {r['errors']:>4} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} "
+              f"{r['spotify_per_cmd']:>12.3f} {r['discord_per_cmd']:>12.2f} {r['loop_lag_p99_ms']:>8.1f} {r['loop_lag_max_ms']:>8.1f}")
+    print(f"\nSpotify stand-in: {sum(fake.requests.values())} requests, faults {fake.faults}, "
+          f"scheduler throttled {harness.lp.spotify_scheduler.throttled}x")
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive LPBot's command handlers under load.")
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--users", type=int, default=20, help="users per guild")
+    parser.add_argument("--adds-per-user", type=int, default=2)
+    parser.add_argument("--status-per-guild", type=int, default=3)
+    parser.add_argument("--poll-entries", type=int, default=12, help="users per guild submitting a poll entry")
+    parser.add_argument("--spotify-latency-ms", type=float, default=50)
+    parser.add_argument("--spotify-jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--spotify-rate", type=float, default=1000,
+                        help="overrides SPOTIFY_RATE; use the production value (10) to measure queueing behind the limiter")
+    parser.add_argument("--discord-latency-ms", type=float, default=0)
+    parser.add_argument("--reaction-seed-delay", type=float, default=0, help="overrides REACTION_SEED_DELAY")
+    parser.add_argument("--port", type=int, default=8901, help="port for the in-process Spotify stand-in")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    fake = fake_spotify.FakeSpotify(args.spotify_latency_ms, args.spotify_jitter_ms, args.rate_429,
+                                    1, args.rate_5xx, seed=args.seed)
+    api_url = fake_spotify.start_in_thread(fake, port=args.port)
+    lp = import_lpbot(api_url, args.reaction_seed_delay, args.spotify_rate)
+
+    harness = Harness(lp, fake, args)
+    asyncio.run(harness.run())
+    report(harness, args, fake)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"args": vars(args), "phases": harness.results, "peak_rss_mb": peak_rss_mb(),
+                       "spotify_requests": fake.requests, "faults": fake.faults}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()